@@ -18,7 +18,7 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 from app.database import Base
 # Import all models here so that they are registered with SQLAlchemy
-from app.models import user, chat
+from app.models import user, chat, idempotency, batch_job, chat_embedding, request_profile
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,50 @@
+"""bump chat updated_at on message insert
+
+Revision ID: 3f1c2a9e7b64
+Revises: d75644b4a3ea
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a9e7b64"
+down_revision: Union[str, Sequence[str], None] = "d75644b4a3ea"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Touch the parent chat whenever a message is added so chats.updated_at
+    # can serve as the ETag / Last-Modified validator for chat reads
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_chat_on_message()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            UPDATE chats SET updated_at = NOW() WHERE id = NEW.chat_id;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+    )
+
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_touch_chat_on_message ON messages;
+        CREATE TRIGGER trg_touch_chat_on_message
+        AFTER INSERT ON messages
+        FOR EACH ROW EXECUTE FUNCTION touch_chat_on_message();
+    """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_touch_chat_on_message ON messages;")
+    op.execute("DROP FUNCTION IF EXISTS touch_chat_on_message();")
@@ -0,0 +1,33 @@
+"""add messages chat order index
+
+Revision ID: f2b6d8a3c540
+Revises: e8a4f2c6b917
+Create Date: 2026-10-19 18:31:52.064718
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b6d8a3c540"
+down_revision: Union[str, Sequence[str], None] = "e8a4f2c6b917"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Serves the export's (chat_id, created_at, id) keyset pages without a sort
+    op.create_index(
+        "ix_messages_chat_id_created_at_id",
+        "messages",
+        ["chat_id", "created_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_chat_id_created_at_id", table_name="messages")
@@ -1,14 +1,16 @@
 from typing import Generator, Optional
 import time
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
+from app.database import SessionLocal, replica_router
 from app.models.user import User
+from app.core.profiling import profile_phase
+from app.core.read_your_writes import reads_from_primary
 from app.core.security import SECRET_KEY, ALGORITHM
 from app.schemas.user import TokenPayload
 
@@ -25,11 +27,31 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """Dependency for a read-only DB session, served by a replica when one is usable"""
+    db = replica_router.session_for(primary=reads_from_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
     """Dependency for getting the current authenticated user"""
+    return _authenticate(db, token)
+
+
+async def get_current_reader(db: Session = Depends(get_read_db), token: str = Depends(oauth2_scheme)) -> User:
+    """Dependency for the current user on read-only endpoints"""
+    return _authenticate(db, token)
+
+
+def _authenticate(db: Session, token: str) -> User:
+    """Validate the token and load its user"""
     try:
         # Decode the JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with profile_phase("jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         token_data = TokenPayload(**payload)
         
         # Check if token is expired
@@ -47,7 +69,8 @@ async def get_current_user(db: Session = Depends(get_db), token: str = Depends(o
         )
     
     # Get the user from the database
-    user = db.query(User).filter(User.id == token_data.sub).first()
+    with profile_phase("user_lookup"):
+        user = db.query(User).filter(User.id == token_data.sub).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,3 +1,5 @@
 from .auth import *
 from .users import *
 from .chats import *
+from .profiles import *
+from .jobs import *
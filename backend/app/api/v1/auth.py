@@ -9,8 +9,9 @@ from app.api.deps import get_db
 from app.core.security import create_access_token, verify_password, get_password_hash
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserCreate, Token
+from app.core.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 
 @router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
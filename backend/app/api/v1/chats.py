@@ -1,40 +1,196 @@
 import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.responses import StreamingResponse
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session, joinedload
-from typing import Any, List, AsyncGenerator
-from app.api.deps import get_db, get_current_user
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, List, AsyncGenerator, Iterator, Optional
+from app.api.deps import get_db, get_read_db, get_current_user, get_current_reader
+from app.config import settings
+from app.database import SessionLocal, replica_router
+from app.core.http_cache import (
+    build_etag,
+    cache_headers,
+    is_not_modified,
+    not_modified_response,
+)
+from app.core.archival import chat_with_archive, restore_chat, unpack_messages
+from app.core.idempotency import (
+    claim_key,
+    idempotent_replies,
+    in_progress_error,
+    is_abandoned,
+    request_fingerprint,
+    scoped_key,
+)
 from app.core.llm_service import llm_service
-from app.models.chat import Chat, Message
-from app.schemas.chat import ChatCreate, ChatRead, MessageCreate
+from app.core.read_your_writes import reads_from_primary
+from app.core.related_index import changes_document, related_index
+from app.core.single_flight import flight_key, generation_flights
+from app.core.title_batcher import title_batcher
+from app.models.chat import Chat, ChatArchive, Message
+from app.models.chat_embedding import ChatEmbedding
+from app.models.idempotency import IdempotencyKey
+from app.schemas.chat import ChatCreate, ChatRead, MessageCreate, RelatedChat
 from app.models.user import User
+from app.core.profiling import ProfiledRoute
+from app.core.serialization import ORJSONResponse, chat_transcript
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 logger = logging.getLogger(__name__)
 
 
 @router.post("/", response_model=ChatRead, status_code=status.HTTP_201_CREATED)
 async def create_chat(
     chat_in: ChatCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
-    # Generate title from initial query using LLM (no context for title generation)
-    title = await llm_service.generate_response(chat_in.initial_query, title_mode=True)
-    chat = Chat(user_id=current_user.id, name=title)
-    db.add(chat)
-    db.commit()
-    db.refresh(chat)
-    # Add first user message
-    message = Message(chat_id=chat.id, role="user", content=chat_in.initial_query)
-    db.add(message)
-    db.commit()
-    db.refresh(message)
+    record = None
+    if idempotency_key:
+        record, created = claim_key(
+            db,
+            current_user.id,
+            idempotency_key,
+            request_fingerprint("create_chat", chat_in.model_dump_json()),
+        )
+        if not created:
+            chat = db.get(Chat, record.chat_id) if record.chat_id else None
+            if record.status == "completed" and chat is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+                return chat_with_archive(chat, chat.archive)
+            if not is_abandoned(record):
+                raise in_progress_error()
+            # The original request died before creating the chat; take it over
+            record.created_at = func.now()
+            db.commit()
+
+    try:
+        # Generate title from initial query using LLM (no context for title generation);
+        # concurrent chat creations share one batched title call
+        title = await title_batcher.title(chat_in.initial_query)
+        chat = Chat(user_id=current_user.id, name=title, explanation_levels=chat_in.levels)
+        db.add(chat)
+        db.commit()
+        db.refresh(chat)
+        # Add first user message
+        message = Message(chat_id=chat.id, role="user", content=chat_in.initial_query)
+        db.add(message)
+        if record is not None:
+            db.flush()
+            record.chat_id = chat.id
+            record.message_id = message.id
+            record.status = "completed"
+        db.commit()
+        db.refresh(message)
+    except Exception:
+        # Let a retry with the same key start over
+        db.rollback()
+        if record is not None:
+            db.delete(record)
+            db.commit()
+        raise
+    related_index.index_soon(current_user.id, chat.id)
     chat.messages.append(message)
     return chat
 
 
+async def _assistant_reply(
+    db: Session,
+    user_id: str,
+    chat_id: str,
+    user_message_id: str,
+    content: str,
+    context: list,
+    levels: Optional[List[str]],
+    record: Optional[IdempotencyKey] = None,
+) -> AsyncGenerator[str, None]:
+    """Stream the assistant's reply as NDJSON lines and save it when complete"""
+    try:
+        # Stream assistant reply with context
+        assistant_content = ""
+
+        def generate() -> AsyncGenerator[str, None]:
+            return llm_service.generate_response_stream(content, context, levels)
+
+        chunks = (
+            generation_flights.stream(flight_key(content, context, levels), generate)
+            if settings.LLM_SINGLE_FLIGHT
+            else generate()
+        )
+        async for chunk in chunks:
+            assistant_content += chunk
+            response_chunk = {
+                "type": "token",
+                "content": chunk,
+                "id": f"streaming-{user_message_id}",
+            }
+            yield json.dumps(response_chunk) + "\n"
+
+        # Save the complete assistant message
+        assistant_message = Message(
+            chat_id=chat_id, role="assistant", content=assistant_content
+        )
+        db.add(assistant_message)
+        if record is not None:
+            db.flush()
+            record.response_message_id = assistant_message.id
+            record.status = "completed"
+        db.commit()
+        db.refresh(assistant_message)
+        # The first answers are part of what a chat is found by in related search
+        if changes_document(db, chat_id):
+            related_index.index_soon(user_id, chat_id)
+
+        # Send completion signal
+        completion_chunk = {
+            "type": "complete",
+            "id": assistant_message.id,
+        }
+        yield json.dumps(completion_chunk) + "\n"
+
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}")
+        if record is not None:
+            # A retry with the same key regenerates the reply to the saved message
+            db.rollback()
+            record.status = "failed"
+            db.commit()
+        error_chunk = {
+            "type": "error",
+            "content": "Sorry, something went wrong. Please try again later.",
+            "id": f"error-{user_message_id}",
+        }
+        yield json.dumps(error_chunk) + "\n"
+
+
+def _reply_context(db: Session, chat_id: str, user_message: Message) -> list:
+    """Last 5 messages up to and including `user_message`"""
+    messages = (
+        db.query(Message)
+        .filter(Message.chat_id == chat_id, Message.created_at <= user_message.created_at)
+        .order_by(Message.created_at.desc())
+        .limit(5)
+        .all()
+    )
+    return [{"role": msg.role, "content": msg.content} for msg in reversed(messages)]
+
+
+def _replay_reply(user_message_id: str, assistant_message: Message) -> Iterator[str]:
+    """Replay a saved reply using the same NDJSON protocol as a live stream"""
+    response_chunk = {
+        "type": "token",
+        "content": assistant_message.content,
+        "id": f"streaming-{user_message_id}",
+    }
+    yield json.dumps(response_chunk) + "\n"
+    yield json.dumps({"type": "complete", "id": assistant_message.id}) + "\n"
+
+
 @router.post(
     "/{chat_id}/messages",
     status_code=status.HTTP_201_CREATED,
@@ -42,6 +198,7 @@ async def create_chat(
 async def add_message(
     chat_id: str,
     message_in: MessageCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
@@ -58,11 +215,44 @@ async def add_message(
     if message_in.role != "user":
         raise HTTPException(status_code=400, detail="Only user messages are accepted.")
 
-    # Save user message
-    user_message = Message(chat_id=chat_id, role="user", content=message_in.content)
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    # Only generate the explanation sections this user actually reads
+    levels = message_in.levels or chat.explanation_levels or current_user.explanation_levels
+
+    record = None
+    if idempotency_key:
+        record, created = claim_key(
+            db,
+            current_user.id,
+            idempotency_key,
+            request_fingerprint("add_message", chat_id, message_in.model_dump_json()),
+        )
+        if not created:
+            if record.message_id is not None or not is_abandoned(record):
+                return _resume_reply(db, chat_id, record, message_in, levels)
+            # The original request died before saving the message; take it over
+            record.created_at = func.now()
+            db.commit()
+
+    try:
+        # A new message re-promotes an archived chat into the hot table
+        restore_chat(db, chat_id)
+
+        # Save user message
+        user_message = Message(chat_id=chat_id, role="user", content=message_in.content)
+        db.add(user_message)
+        if record is not None:
+            db.flush()
+            record.chat_id = chat_id
+            record.message_id = user_message.id
+        db.commit()
+        db.refresh(user_message)
+    except Exception:
+        # Let a retry with the same key start over
+        db.rollback()
+        if record is not None:
+            db.delete(record)
+            db.commit()
+        raise
 
     # Build context list of last 5 messages (including new user message)
     all_messages = (
@@ -73,70 +263,291 @@ async def add_message(
     )
     context = [{"role": msg.role, "content": msg.content} for msg in all_messages[-5:]]
 
-    async def stream_response() -> AsyncGenerator[str, None]:
+    if record is None:
+        return StreamingResponse(
+            _assistant_reply(
+                db, current_user.id, chat_id, user_message.id, message_in.content, context, levels
+            ),
+            media_type="application/json",
+        )
+    return _start_keyed_reply(
+        current_user.id, record, chat_id, user_message.id, message_in.content, context, levels
+    )
+
+
+def _start_keyed_reply(
+    user_id: str,
+    record: IdempotencyKey,
+    chat_id: str,
+    user_message_id: str,
+    content: str,
+    context: list,
+    levels: Optional[List[str]],
+) -> StreamingResponse:
+    """Generate a keyed reply detached from this connection so retries can re-attach"""
+    key = record.key
+
+    async def job() -> AsyncGenerator[str, None]:
+        job_db = SessionLocal()
         try:
-            # Stream assistant reply with context
-            assistant_content = ""
-            async for chunk in llm_service.generate_response_stream(
-                message_in.content, context
+            job_record = job_db.get(IdempotencyKey, (user_id, key))
+            async for line in _assistant_reply(
+                job_db, user_id, chat_id, user_message_id, content, context, levels, job_record
             ):
-                assistant_content += chunk
-                response_chunk = {
-                    "type": "token",
-                    "content": chunk,
-                    "id": f"streaming-{user_message.id}",
-                }
-                yield json.dumps(response_chunk) + "\n"
-
-            # Save the complete assistant message
-            assistant_message = Message(
-                chat_id=chat_id, role="assistant", content=assistant_content
-            )
-            db.add(assistant_message)
-            db.commit()
-            db.refresh(assistant_message)
-
-            # Send completion signal
-            completion_chunk = {
-                "type": "complete",
-                "id": assistant_message.id,
-            }
-            yield json.dumps(completion_chunk) + "\n"
-
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            error_chunk = {
-                "type": "error",
-                "content": "Sorry, something went wrong. Please try again later.",
-                "id": f"error-{user_message.id}",
-            }
-            yield json.dumps(error_chunk) + "\n"
+                yield line
+        finally:
+            job_db.close()
 
     return StreamingResponse(
-        stream_response(),
+        idempotent_replies.stream(scoped_key(user_id, key), job, detached=True),
         media_type="application/json",
     )
 
 
+def _resume_reply(
+    db: Session,
+    chat_id: str,
+    record: IdempotencyKey,
+    message_in: MessageCreate,
+    levels: Optional[List[str]],
+) -> StreamingResponse:
+    """Answer a retried message request without saving or generating twice"""
+    headers = {"Idempotent-Replayed": "true"}
+    attached = idempotent_replies.attach(scoped_key(record.user_id, record.key))
+    if attached is not None:
+        # Original generation still running in this process: re-attach to it
+        return StreamingResponse(attached, media_type="application/json", headers=headers)
+
+    user_message = db.get(Message, record.message_id) if record.message_id else None
+    if record.status == "completed" and user_message is not None:
+        assistant_message = db.get(Message, record.response_message_id)
+        if assistant_message is not None:
+            return StreamingResponse(
+                _replay_reply(user_message.id, assistant_message),
+                media_type="application/json",
+                headers=headers,
+            )
+
+    if user_message is None or (record.status == "in_progress" and not is_abandoned(record)):
+        raise in_progress_error()
+
+    # The original generation failed or died: regenerate for the saved message
+    record.status = "in_progress"
+    record.created_at = func.now()
+    db.commit()
+    context = _reply_context(db, chat_id, user_message)
+    return _start_keyed_reply(
+        record.user_id, record, chat_id, user_message.id, message_in.content, context, levels
+    )
+
+
 @router.get("/", response_model=List[ChatRead])
 async def list_chats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
 ) -> Any:
+    # Cheap aggregate first: count catches deletions, max(updated_at) catches
+    # new chats and new messages (a message insert bumps its chat's updated_at)
+    chat_count, last_modified = (
+        db.query(func.count(Chat.id), func.max(Chat.updated_at))
+        .filter(Chat.user_id == current_user.id)
+        .one()
+    )
+    etag = build_etag("chats", current_user.id, chat_count, last_modified)
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+    response.headers.update(headers)
+
     chats = (
         db.query(Chat)
         .filter(Chat.user_id == current_user.id)
         .order_by(Chat.updated_at.desc())
         .all()
     )
-    return chats
+    archives = {
+        archive.chat_id: archive
+        for archive in db.query(ChatArchive)
+        .join(Chat)
+        .filter(Chat.user_id == current_user.id)
+    }
+    if not archives:
+        return chats
+    return [chat_with_archive(chat, archives.get(chat.id)) for chat in chats]
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _message_line(chat_id: str, message: dict) -> str:
+    message_line = {
+        "type": "message",
+        "chat_id": chat_id,
+        "id": message["id"],
+        "role": message["role"],
+        "content": message["content"],
+        "created_at": _isoformat(message["created_at"]),
+    }
+    return json.dumps(message_line) + "\n"
+
+
+def _keyset_pages(
+    primary: bool, page: Callable[[Session, Optional[tuple]], List[tuple]]
+) -> Iterator[tuple]:
+    """Yield the rows of `page(db, after_row)` one EXPORT_BATCH_SIZE page at a time.
+
+    Each page is read in its own short session that is closed before any of
+    its rows are yielded, so a slow reader never holds a connection or an
+    open transaction between pages.
+    """
+    after = None
+    while True:
+        db = replica_router.session_for(primary)
+        try:
+            rows = page(db, after)
+        finally:
+            db.close()
+        yield from rows
+        if len(rows) < settings.EXPORT_BATCH_SIZE:
+            return
+        after = rows[-1]
+
+
+def _export_chat_page(user_id: str, db: Session, after: Optional[tuple]) -> List[tuple]:
+    query = (
+        db.query(Chat.created_at, Chat.id, Chat.name, Chat.updated_at, ChatArchive.payload)
+        .outerjoin(ChatArchive, ChatArchive.chat_id == Chat.id)
+        .filter(Chat.user_id == user_id)
+    )
+    if after is not None:
+        query = query.filter(tuple_(Chat.created_at, Chat.id) > tuple_(*after[:2]))
+    return query.order_by(Chat.created_at, Chat.id).limit(settings.EXPORT_BATCH_SIZE).all()
+
+
+def _export_message_page(user_id: str, db: Session, after: Optional[tuple]) -> List[tuple]:
+    # Ordered by chat the same way as the chat pages, so the two can be merged
+    key = (Chat.created_at, Message.chat_id, Message.created_at, Message.id)
+    query = (
+        db.query(*key, Message.role, Message.content)
+        .join(Chat, Chat.id == Message.chat_id)
+        .filter(Chat.user_id == user_id)
+    )
+    if after is not None:
+        query = query.filter(tuple_(*key) > tuple_(*after[:4]))
+    return query.order_by(*key).limit(settings.EXPORT_BATCH_SIZE).all()
+
+
+def _export_lines(user_id: str, primary: bool = False) -> Iterator[str]:
+    """Yield one NDJSON line per chat followed by one line per message.
+
+    Chats and messages are read as plain tuples in keyset-paginated pages
+    of EXPORT_BATCH_SIZE and merged, so memory stays flat regardless of
+    history size and no connection is held while the client reads.
+    """
+    messages = _keyset_pages(primary, partial(_export_message_page, user_id))
+    pending = next(messages, None)
+    for chat_created_at, chat_id, name, chat_updated_at, archive_payload in _keyset_pages(
+        primary, partial(_export_chat_page, user_id)
+    ):
+        chat_line = {
+            "type": "chat",
+            "id": chat_id,
+            "name": name,
+            "created_at": _isoformat(chat_created_at),
+            "updated_at": _isoformat(chat_updated_at),
+        }
+        yield json.dumps(chat_line) + "\n"
+        if archive_payload is not None:
+            for message in unpack_messages(archive_payload):
+                yield _message_line(chat_id, message)
+        # Skip messages of chats created after their page was read
+        while pending is not None and (pending[0], pending[1]) < (chat_created_at, chat_id):
+            pending = next(messages, None)
+        while pending is not None and pending[1] == chat_id:
+            _, _, message_created_at, message_id, role, content = pending
+            message = {
+                "id": message_id,
+                "role": role,
+                "content": content,
+                "created_at": message_created_at,
+            }
+            yield _message_line(chat_id, message)
+            pending = next(messages, None)
+
+
+@router.get("/export")
+async def export_chats(
+    request: Request, current_user: User = Depends(get_current_reader)
+) -> Any:
+    """Stream the user's full chat history as NDJSON"""
+    # StreamingResponse iterates sync generators in the threadpool
+    return StreamingResponse(
+        _export_lines(current_user.id, reads_from_primary(request)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="elelem-export.ndjson"'},
+    )
+
+
+def _related_chats(db: Session, user_id: str, matches: List[tuple]) -> List[dict]:
+    """Attach names to (chat_id, score) matches, dropping chats deleted since indexing"""
+    chats = {
+        chat.id: chat
+        for chat in db.query(Chat.id, Chat.name, Chat.updated_at).filter(
+            Chat.user_id == user_id, Chat.id.in_([chat_id for chat_id, _ in matches])
+        )
+    }
+    return [
+        {
+            "id": chat_id,
+            "name": chats[chat_id].name,
+            "updated_at": chats[chat_id].updated_at,
+            "score": round(score, 4),
+        }
+        for chat_id, score in matches
+        if chat_id in chats
+    ]
+
+
+@router.get("/related", response_model=List[RelatedChat])
+async def search_related_chats(
+    q: str = Query(..., min_length=1, max_length=2000),
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
+) -> Any:
+    """Past chats that explained something similar to `q`"""
+    matches = await related_index.related_to_query(current_user.id, q, limit)
+    return _related_chats(db, current_user.id, matches)
+
+
+@router.get("/{chat_id}/related", response_model=List[RelatedChat])
+async def get_related_chats(
+    chat_id: str,
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
+) -> Any:
+    """Other chats of this user on a similar topic"""
+    chat = (
+        db.query(Chat.id)
+        .filter(Chat.id == chat_id, Chat.user_id == current_user.id)
+        .first()
+    )
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    matches = await related_index.related_to_chat(current_user.id, chat_id, limit)
+    return _related_chats(db, current_user.id, matches)
 
 
 @router.get("/{chat_id}", response_model=ChatRead)
 async def get_chat(
     chat_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
 ) -> Any:
     chat = (
         db.query(Chat)
@@ -145,7 +556,14 @@ async def get_chat(
     )
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    return chat
+
+    # Answer revalidations before the transcript is loaded
+    etag = build_etag("chat", chat.id, chat.updated_at)
+    headers = cache_headers(etag, chat.updated_at)
+    if is_not_modified(request, etag, chat.updated_at):
+        return not_modified_response(headers)
+    # Bypasses ChatRead validation; the payload is built to the same shape
+    return ORJSONResponse(chat_transcript(db, chat, chat.archive), headers=headers)
 
 
 @router.delete("/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -164,5 +582,6 @@ async def delete_chat(
 
     # Delete all messages first to maintain referential integrity
     db.query(Message).filter(Message.chat_id == chat_id).delete()
+    db.query(ChatEmbedding).filter(ChatEmbedding.chat_id == chat_id).delete()
     db.delete(chat)
     db.commit()
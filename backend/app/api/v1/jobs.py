@@ -0,0 +1,196 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, List, Set, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db, get_read_db, get_current_user, get_current_reader
+from app.config import settings
+from app.core.batch_jobs import batch_runner
+from app.database import SessionLocal
+from app.models.batch_job import BatchJob, BatchJobItem
+from app.models.chat import Message
+from app.models.user import User
+from app.schemas.batch_job import BatchJobCreate, BatchJobDetail, BatchJobRead
+from app.core.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+
+def _user_job(db: Session, job_id: str, user_id: str) -> BatchJob:
+    job = db.query(BatchJob).filter(BatchJob.id == job_id, BatchJob.user_id == user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/", response_model=BatchJobRead, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job_in: BatchJobCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Queue topics to be explained in the background, one chat per topic"""
+    if len(job_in.topics) > settings.BATCH_MAX_TOPICS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A job can contain at most {settings.BATCH_MAX_TOPICS} topics",
+        )
+    job = BatchJob(
+        user_id=current_user.id,
+        explanation_levels=job_in.levels or current_user.explanation_levels,
+        total=len(job_in.topics),
+        completed_count=0,
+        failed_count=0,
+    )
+    job.items = [
+        BatchJobItem(position=position, topic=topic, status="pending", attempts=0)
+        for position, topic in enumerate(job_in.topics)
+    ]
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    batch_runner.notify()
+    return job
+
+
+@router.get("/", response_model=List[BatchJobRead])
+async def list_jobs(
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
+) -> Any:
+    return (
+        db.query(BatchJob)
+        .filter(BatchJob.user_id == current_user.id)
+        .order_by(BatchJob.created_at.desc())
+        .all()
+    )
+
+
+@router.get("/{job_id}", response_model=BatchJobDetail)
+async def get_job(
+    job_id: str,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
+) -> Any:
+    """Job progress with the status of every topic"""
+    return _user_job(db, job_id, current_user.id)
+
+
+@router.post("/{job_id}/cancel", response_model=BatchJobRead)
+async def cancel_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Stop a job; topics already being explained still finish"""
+    job = _user_job(db, job_id, current_user.id)
+    if job.status in ("queued", "running"):
+        db.query(BatchJobItem).filter(
+            BatchJobItem.job_id == job.id, BatchJobItem.status == "pending"
+        ).update({BatchJobItem.status: "cancelled"}, synchronize_session=False)
+        job.status = "cancelled"
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def _result_line(position, topic, item_status, chat_id, error, content) -> str:
+    result_line = {
+        "type": "result",
+        "position": position,
+        "topic": topic,
+        "status": item_status,
+        "chat_id": chat_id,
+    }
+    if item_status == "completed":
+        result_line["content"] = content
+    else:
+        result_line["error"] = error
+    return json.dumps(result_line) + "\n"
+
+
+def _poll_job(job_id: str, seen: Set[str]) -> Tuple[Tuple[str, int, int], list]:
+    """The job's status and counts, and its finished items not in `seen`.
+
+    Uses its own short-lived session so an open stream does not hold a
+    database connection while it waits.
+    """
+    db = SessionLocal()
+    try:
+        job_row = (
+            db.query(BatchJob.status, BatchJob.completed_count, BatchJob.failed_count)
+            .filter(BatchJob.id == job_id)
+            .one()
+        )
+        rows = (
+            db.query(
+                BatchJobItem.id,
+                BatchJobItem.position,
+                BatchJobItem.topic,
+                BatchJobItem.status,
+                BatchJobItem.chat_id,
+                BatchJobItem.error,
+                Message.content,
+            )
+            .outerjoin(
+                Message,
+                and_(Message.chat_id == BatchJobItem.chat_id, Message.role == "assistant"),
+            )
+            .filter(
+                BatchJobItem.job_id == job_id,
+                BatchJobItem.status.in_(("completed", "failed")),
+                # Worker clocks and commit order can disagree, so track
+                # what was sent rather than a finished_at cursor
+                BatchJobItem.id.notin_(seen),
+            )
+            .order_by(BatchJobItem.finished_at, BatchJobItem.position)
+            .all()
+        )
+        return tuple(job_row), rows
+    finally:
+        db.close()
+
+
+async def _job_results(job_id: str) -> AsyncGenerator[str, None]:
+    """Yield each finished topic once, in completion order, until the job ends.
+
+    Each poll runs in the threadpool, so open streams never block the event loop.
+    """
+    seen: Set[str] = set()
+    while True:
+        (job_status, completed_count, failed_count), rows = await run_in_threadpool(
+            _poll_job, job_id, set(seen)
+        )
+
+        for item_id, position, topic, item_status, chat_id, error, content in rows:
+            seen.add(item_id)
+            yield _result_line(position, topic, item_status, chat_id, error, content)
+
+        if job_status in ("completed", "cancelled"):
+            completion_line = {
+                "type": "complete",
+                "status": job_status,
+                "completed": completed_count,
+                "failed": failed_count,
+            }
+            yield json.dumps(completion_line) + "\n"
+            return
+        await asyncio.sleep(settings.BATCH_POLL_SECONDS)
+
+
+@router.get("/{job_id}/results")
+async def stream_job_results(
+    job_id: str,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
+) -> Any:
+    """Stream results as NDJSON while the job runs, ending with a completion line"""
+    _user_job(db, job_id, current_user.id)
+    return StreamingResponse(_job_results(job_id), media_type="application/x-ndjson")
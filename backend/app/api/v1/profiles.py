@@ -0,0 +1,49 @@
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db
+from app.core.llm_service import llm_service
+from app.core.profiling import PROFILE_HEADER, is_profiling_admin, profile_store
+
+router = APIRouter()
+
+
+def require_profiling_admin(token: Optional[str] = Header(None, alias=PROFILE_HEADER)) -> None:
+    """Dependency restricting profile access to holders of the admin token"""
+    if not is_profiling_admin(token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+
+@router.get("/", dependencies=[Depends(require_profiling_admin)])
+def list_profiles(db: Session = Depends(get_db)) -> Any:
+    """List stored request profiles, newest first"""
+    return [profile.summary for profile in profile_store.list(db)]
+
+
+@router.get("/metrics", dependencies=[Depends(require_profiling_admin)])
+async def get_metrics() -> Any:
+    """Process-local LLM metrics (per-tier latency and tokens, hedging)"""
+    return {"llm": llm_service.metrics()}
+
+
+@router.get("/{profile_id}", dependencies=[Depends(require_profiling_admin)])
+def get_profile(profile_id: str, format: str = "json", db: Session = Depends(get_db)) -> Any:
+    """Get a profile's phase breakdown, or its samples as folded stacks (format=folded)"""
+    profile = profile_store.get(db, profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    if format == "folded":
+        return PlainTextResponse(
+            profile.folded,
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'},
+        )
+    return profile.summary
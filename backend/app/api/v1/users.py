@@ -3,21 +3,35 @@ from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_db, get_read_db, get_current_user, get_current_reader
 from app.models.user import User
-from app.schemas.user import User as UserSchema
+from app.schemas.user import User as UserSchema, UserPreferences
+from app.core.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 
 @router.get("/me", response_model=UserSchema)
-async def read_user_me(current_user: User = Depends(get_current_user)) -> Any:
+async def read_user_me(current_user: User = Depends(get_current_reader)) -> Any:
     """Get current user"""
     return current_user
 
 
+@router.put("/me/preferences", response_model=UserSchema)
+async def update_preferences(
+    preferences: UserPreferences,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Update the current user's default explanation levels"""
+    current_user.explanation_levels = preferences.explanation_levels
+    db.commit()
+    db.refresh(current_user)
+    return current_user
+
+
 @router.get("/{user_id}", response_model=UserSchema)
-async def read_user_by_id(user_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)) -> Any:
+async def read_user_by_id(user_id: str, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_reader)) -> Any:
     """Get a specific user by id"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
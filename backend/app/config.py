@@ -1,7 +1,7 @@
 from typing import Optional, List
 from functools import lru_cache
 from pydantic_settings import BaseSettings
-from pydantic import PostgresDsn
+from pydantic import Field, PostgresDsn
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -17,6 +17,17 @@ class Settings(BaseSettings):
 
     # Database settings
     DATABASE_URL: Optional[PostgresDsn]
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # Connections opened during startup before the app reports ready
+    DB_WARM_CONNECTIONS: int = 2
+    # Optional read replicas used by read-only endpoints
+    DATABASE_REPLICA_URLS: List[str] = []
+    # Reads stay on the primary this long after a client's own write (tracked
+    # client-side by a cookie/header, so it holds across workers and instances)
+    REPLICA_STICKY_SECONDS: float = 5.0
+    # How long an unreachable replica is skipped before it is tried again
+    REPLICA_RETRY_SECONDS: float = 30.0
 
     # Security settings
     SECRET_KEY: str = "your-secret-key-for-development-only"
@@ -29,10 +40,99 @@ class Settings(BaseSettings):
         "https://elelem-umber.vercel.app"
     ]
 
+    # Response compression (gzip/zstd) for non-streaming JSON responses
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+
+    # Request profiling: send `X-Profile: <PROFILING_ADMIN_TOKEN>` to profile a request,
+    # and the same header to read profiles back from /profiles
+    PROFILING_ADMIN_TOKEN: Optional[str] = None
+    # Fraction of all requests profiled automatically (0 disables sampling)
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_STORED: int = 50  # newest profiles kept in the database
+
     # LLM settings
     LLM_PROVIDER: str = "gemini"  # openai, deepseek, gemini, or claude
     LLM_API_KEY: Optional[str]
     LLM_MODEL: str = "gemini-2.0-flash"
+    # Route titles and small talk to a fast model tier; full explanations use LLM_MODEL
+    LLM_MODEL_ROUTING: bool = True
+    LLM_FAST_MODEL: str = "gemini-2.0-flash-lite"
+    # Per-route overrides (default: the route's tier model)
+    LLM_TITLE_MODEL: Optional[str] = None
+    LLM_SHORT_MODEL: Optional[str] = None
+    LLM_EXPLANATION_MODEL: Optional[str] = None
+    # Open the provider channel with a token-count call during startup
+    LLM_WARMUP: bool = True
+    LLM_WARMUP_TIMEOUT_SECONDS: float = 5.0
+
+    # LLM transport: a single long-lived gRPC channel shared by all requests
+    LLM_KEEPALIVE_SECONDS: int = 120
+    LLM_KEEPALIVE_TIMEOUT_SECONDS: int = 20
+    # Send a cheap request after this much idle time to keep the channel warm (0 disables)
+    LLM_IDLE_PING_SECONDS: float = 240.0
+    # Longest wait for the provider channel to (re)connect, at warm-up and before each call
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_FIRST_TOKEN_TIMEOUT_SECONDS: float = 20.0
+    LLM_TOTAL_TIMEOUT_SECONDS: float = 120.0
+    # Hedged requests: when the first token is later than the LLM_HEDGE_PERCENTILE of
+    # recent times-to-first-token, send a second request and stream whichever answers first
+    LLM_HEDGING: bool = False
+    # Model for the hedge request (defaults to LLM_MODEL)
+    LLM_HEDGE_MODEL: Optional[str] = None
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    # Hedge delay used until enough samples are collected, and its lower bound
+    LLM_HEDGE_INITIAL_DELAY_MS: float = 2000.0
+    LLM_HEDGE_MIN_DELAY_MS: float = 250.0
+    # At most this fraction of requests is hedged
+    LLM_HEDGE_MAX_RATE: float = 0.05
+    # Concurrent identical generations share one upstream stream
+    LLM_SINGLE_FLIGHT: bool = True
+
+    # Chat titles are collected for this long and generated in one call
+    TITLE_BATCH_WINDOW_MS: int = 100
+    TITLE_BATCH_MAX_SIZE: int = 16
+
+    # How long an Idempotency-Key is remembered for chat/message creation
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+    # Expired keys are deleted at startup and then every N minutes (0 = never)
+    IDEMPOTENCY_PURGE_INTERVAL_MINUTES: int = 60
+
+    # Rows fetched per round trip by the streaming chat export
+    EXPORT_BATCH_SIZE: int = 500
+
+    # Chats idle this long have their messages moved to the archive table
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 200
+    # Run archival in-process every N minutes (0 = only via `python -m app.core.archival`)
+    ARCHIVE_INTERVAL_MINUTES: int = 0
+
+    # Batch explanation jobs (POST /jobs) run in the `python -m app.core.batch_jobs`
+    # worker; set this to also run them inside web processes (e.g. without a worker)
+    BATCH_RUN_IN_WEB: bool = False
+    # Items in flight per process that runs jobs
+    BATCH_CONCURRENCY: int = Field(4, ge=1)
+    # Items (one provider call each) started per minute, enforced separately by each process that runs
+    # jobs: divide the provider's limit by the number of such processes (0 = no limit)
+    BATCH_REQUESTS_PER_MINUTE: int = Field(60, ge=0)
+    BATCH_MAX_ATTEMPTS: int = 3
+    # Retry delay doubles from this on each failed attempt (with jitter)
+    BATCH_RETRY_BASE_SECONDS: float = 5.0
+    # How often idle workers and result streams check for new work
+    BATCH_POLL_SECONDS: float = 2.0
+    BATCH_MAX_TOPICS: int = 500
+
+    # Related-chats index: embeddings live in the database; each process keeps
+    # per-user float16 copies memory-mapped from this directory (a cache)
+    RELATED_INDEX_DIR: str = str(Path(__file__).parent.parent / "data" / "related_index")
+    # Users whose vectors a process keeps mapped at once
+    RELATED_CACHE_USERS: int = 256
+    # "local" (deterministic feature hashing, no network) or "gemini"
+    EMBEDDING_PROVIDER: str = "local"
+    EMBEDDING_MODEL: str = "models/text-embedding-004"
+    EMBEDDING_DIM: int = 256
+    # Related chats scoring below this cosine similarity are not returned
+    RELATED_MIN_SCORE: float = 0.1
 
     class Config:
         env_file = str(Path(__file__).parent.parent / ".env")
@@ -0,0 +1,132 @@
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import zstandard
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.chat import Chat, ChatArchive, Message
+
+logger = logging.getLogger(__name__)
+
+ZSTD_LEVEL = 9
+
+
+def pack_messages(rows: List[Any]) -> bytes:
+    """Compress (id, role, content, created_at) rows into an archive payload"""
+    records = [
+        [message_id, role, content, created_at.isoformat() if created_at else None]
+        for message_id, role, content, created_at in rows
+    ]
+    raw = json.dumps(records, separators=(",", ":")).encode("utf-8")
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+
+
+def unpack_messages(payload: bytes) -> List[Dict[str, Any]]:
+    """Decode an archive payload into message dicts shaped like MessageRead"""
+    records = json.loads(zstandard.ZstdDecompressor().decompress(payload))
+    return [
+        {
+            "id": message_id,
+            "role": role,
+            "content": content,
+            "created_at": datetime.fromisoformat(created_at) if created_at else None,
+        }
+        for message_id, role, content, created_at in records
+    ]
+
+
+def chat_with_archive(chat: Chat, archive: Optional[ChatArchive]) -> Any:
+    """The chat itself, or a ChatRead-shaped dict with archived messages rehydrated"""
+    if archive is None:
+        return chat
+    messages = unpack_messages(archive.payload)
+    # A message can land while the chat is being archived; keep it in order
+    messages += [
+        {"id": m.id, "role": m.role, "content": m.content, "created_at": m.created_at}
+        for m in chat.messages
+    ]
+    return {
+        "id": chat.id,
+        "name": chat.name,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "messages": messages,
+    }
+
+
+def restore_chat(db: Session, chat_id: str) -> bool:
+    """Move an archived chat's messages back into the hot table (caller commits)"""
+    archive = db.get(ChatArchive, chat_id, with_for_update=True)
+    if archive is None:
+        return False
+    messages = [
+        {**message, "chat_id": chat_id} for message in unpack_messages(archive.payload)
+    ]
+    if messages:
+        db.execute(insert(Message), messages)
+    db.delete(archive)
+    db.flush()
+    return True
+
+
+def archive_idle_chats(db: Session, idle_for: timedelta, limit: int) -> int:
+    """Archive up to `limit` chats with no activity for `idle_for`.
+
+    Chat rows are locked with SKIP LOCKED so concurrent runs (or several
+    app instances) never pick the same chat. Archiving does not touch the
+    chats row, so updated_at and the chat's ETag are unchanged.
+    """
+    cutoff = datetime.now(timezone.utc) - idle_for
+    chats = (
+        db.query(Chat.id)
+        .filter(Chat.updated_at < cutoff, ~Chat.archive.has())
+        .order_by(Chat.updated_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    archived = 0
+    for (chat_id,) in chats:
+        rows = (
+            db.query(Message.id, Message.role, Message.content, Message.created_at)
+            .filter(Message.chat_id == chat_id)
+            .order_by(Message.created_at)
+            .all()
+        )
+        db.add(
+            ChatArchive(chat_id=chat_id, payload=pack_messages(rows), message_count=len(rows))
+        )
+        db.query(Message).filter(Message.chat_id == chat_id).delete(
+            synchronize_session=False
+        )
+        archived += 1
+    db.commit()
+    return archived
+
+
+def run_archival(db: Session) -> int:
+    """Archive idle chats in batches until none are left"""
+    total = 0
+    idle_for = timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    while True:
+        archived = archive_idle_chats(db, idle_for, settings.ARCHIVE_BATCH_SIZE)
+        total += archived
+        if archived < settings.ARCHIVE_BATCH_SIZE:
+            break
+    logger.info(f"Archived {total} idle chats")
+    return total
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal, get_engine
+
+    get_engine()
+    session = SessionLocal()
+    try:
+        run_archival(session)
+    finally:
+        session.close()
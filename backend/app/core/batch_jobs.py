@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.llm_service import llm_service
+from app.core.related_index import related_index
+from app.core.title_batcher import heuristic_title
+from app.database import SessionLocal
+from app.models.batch_job import BatchJob, BatchJobItem
+from app.models.chat import Chat, Message
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces acquisitions evenly so at most `per_minute` happen a minute (0 = no limit)"""
+
+    def __init__(self, per_minute: int) -> None:
+        self.interval = 60 / per_minute if per_minute > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = max(self._next_at, loop.time()) + self.interval
+
+
+@dataclass
+class ClaimedItem:
+    id: str
+    job_id: str
+    user_id: str
+    topic: str
+    attempts: int
+    levels: Optional[List[str]]
+
+
+def claim_next_item(db: Session) -> Optional[ClaimedItem]:
+    """Mark the oldest due pending item as running and return it.
+
+    Rows are locked with SKIP LOCKED, so any number of worker processes can
+    claim from the same table without handing out an item twice.
+    """
+    row = (
+        db.query(BatchJobItem, BatchJob)
+        .join(BatchJob, BatchJob.id == BatchJobItem.job_id)
+        .filter(
+            BatchJobItem.status == "pending",
+            BatchJobItem.next_attempt_at <= func.now(),
+            BatchJob.status.in_(("queued", "running")),
+        )
+        .order_by(BatchJobItem.next_attempt_at, BatchJobItem.position)
+        .with_for_update(skip_locked=True, of=BatchJobItem)
+        .first()
+    )
+    if row is None:
+        db.rollback()
+        return None
+    item, job = row
+    item.status = "running"
+    item.attempts += 1
+    item.claimed_at = datetime.now(timezone.utc)
+    if job.status == "queued":
+        db.query(BatchJob).filter(BatchJob.id == job.id, BatchJob.status == "queued").update(
+            {BatchJob.status: "running"}, synchronize_session=False
+        )
+    db.commit()
+    return ClaimedItem(
+        id=item.id,
+        job_id=job.id,
+        user_id=job.user_id,
+        topic=item.topic,
+        attempts=item.attempts,
+        levels=job.explanation_levels,
+    )
+
+
+def requeue_stale_items(db: Session) -> int:
+    """Return items left running by a worker that died back to the queue"""
+    stale = datetime.now(timezone.utc) - timedelta(seconds=settings.LLM_TOTAL_TIMEOUT_SECONDS * 2)
+    requeued = (
+        db.query(BatchJobItem)
+        .filter(BatchJobItem.status == "running", BatchJobItem.claimed_at < stale)
+        .update(
+            {BatchJobItem.status: "pending", BatchJobItem.next_attempt_at: func.now()},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return requeued
+
+
+def _count_finished(db: Session, job_id: str, completed: bool) -> None:
+    job = db.get(BatchJob, job_id, with_for_update=True)
+    if completed:
+        job.completed_count += 1
+    else:
+        job.failed_count += 1
+    if job.status == "running" and job.completed_count + job.failed_count >= job.total:
+        job.status = "completed"
+        job.finished_at = datetime.now(timezone.utc)
+
+
+def save_result(db: Session, claimed: ClaimedItem, title: str, content: str) -> str:
+    """Persist an explained topic as a chat and mark its item completed"""
+    chat = Chat(user_id=claimed.user_id, name=title, explanation_levels=claimed.levels)
+    db.add(chat)
+    db.flush()
+    # Both messages are written in one transaction, where now() would tie
+    asked_at = datetime.now(timezone.utc)
+    db.add_all(
+        [
+            Message(chat_id=chat.id, role="user", content=claimed.topic, created_at=asked_at),
+            Message(
+                chat_id=chat.id,
+                role="assistant",
+                content=content,
+                created_at=asked_at + timedelta(microseconds=1),
+            ),
+        ]
+    )
+    item = db.get(BatchJobItem, claimed.id, with_for_update=True)
+    item.status = "completed"
+    item.chat_id = chat.id
+    item.error = None
+    item.finished_at = datetime.now(timezone.utc)
+    _count_finished(db, claimed.job_id, completed=True)
+    db.commit()
+    return chat.id
+
+
+def record_failure(db: Session, claimed: ClaimedItem, error: str) -> bool:
+    """Schedule a retry with exponential backoff, or fail the item; True if retried"""
+    item = db.get(BatchJobItem, claimed.id, with_for_update=True)
+    item.error = error
+    job_status = db.query(BatchJob.status).filter(BatchJob.id == claimed.job_id).scalar()
+    if job_status == "cancelled":
+        item.status = "cancelled"
+        item.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        return False
+    retry = item.attempts < settings.BATCH_MAX_ATTEMPTS
+    if retry:
+        delay = settings.BATCH_RETRY_BASE_SECONDS * 2 ** (item.attempts - 1)
+        item.status = "pending"
+        item.next_attempt_at = datetime.now(timezone.utc) + timedelta(
+            seconds=delay * random.uniform(0.5, 1.5)
+        )
+    else:
+        item.status = "failed"
+        item.finished_at = datetime.now(timezone.utc)
+        _count_finished(db, claimed.job_id, completed=False)
+    db.commit()
+    return retry
+
+
+def _in_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+class BatchRunner:
+    """Bounded pool of batch workers living on the event loop.
+
+    At most `concurrency` items are in flight and provider calls are paced
+    by a rate limiter: each claimed item makes exactly one call, since its
+    topic already makes a title. Database work runs in worker threads, so a busy batch
+    does not stall request handling on the same loop. Items are claimed
+    from the database, so several processes can share the queue; the rate
+    limit is not shared, each process applies its own.
+    """
+
+    def __init__(self, concurrency: int, per_minute: int) -> None:
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(per_minute)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._active: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    def notify(self) -> None:
+        """Wake idle workers now instead of at the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self) -> None:
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._wakeup = asyncio.Event()
+        while True:
+            await self._slots.acquire()
+            # Pace claims rather than calls, so a claimed item starts at once
+            # and a cancelled job has as few items in flight as possible
+            await self.limiter.acquire()
+            self._wakeup.clear()
+            try:
+                claimed = await asyncio.to_thread(_in_session, claim_next_item)
+            except Exception as e:
+                logger.error(f"Claiming a batch item failed: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self._slots.release()
+                await self._idle()
+                continue
+            task = asyncio.create_task(self._process(claimed))
+            self._active.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._active.discard(task)
+        self._slots.release()
+
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=settings.BATCH_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            try:
+                await asyncio.to_thread(_in_session, requeue_stale_items)
+            except Exception as e:
+                logger.error(f"Requeueing stale batch items failed: {str(e)}")
+
+    async def _process(self, claimed: ClaimedItem) -> None:
+        try:
+            content = await llm_service.generate_explanation(claimed.topic, levels=claimed.levels)
+            # A second call per item would double traffic past the rate limit
+            title = heuristic_title(claimed.topic)
+            chat_id = await asyncio.to_thread(_in_session, save_result, claimed, title, content)
+        except asyncio.CancelledError:
+            # Shutting down: the item is requeued once it goes stale
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            retried = await asyncio.to_thread(_in_session, record_failure, claimed, error)
+            logger.warning(
+                f"Batch item {claimed.id} attempt {claimed.attempts} failed"
+                f"{', will retry' if retried else ''}: {error}"
+            )
+            return
+        related_index.index_soon(claimed.user_id, chat_id)
+
+    async def close(self) -> None:
+        for task in [self._task, *self._active]:
+            if task is not None:
+                task.cancel()
+        self._task = None
+
+
+batch_runner = BatchRunner(settings.BATCH_CONCURRENCY, settings.BATCH_REQUESTS_PER_MINUTE)
+
+
+if __name__ == "__main__":
+    # Dedicated worker process, for running batches away from the web dynos
+    from app.database import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    get_engine()
+    asyncio.run(batch_runner.run())
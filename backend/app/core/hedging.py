@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+StreamFactory = Callable[[], AsyncIterator[Any]]
+
+
+class LatencyTracker:
+    """Recent time-to-first-token samples, for percentile-based hedge deadlines"""
+
+    def __init__(self, window: int = 500, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile of recent samples, or None until there are enough"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class HedgeBudget:
+    """Caps hedges at a fraction of requests.
+
+    Every request earns `max_rate` of a credit and a hedge spends a whole
+    one, so sustained hedging can never exceed `max_rate` however slow the
+    provider gets. Credits are capped so a quiet period cannot bank a burst.
+    """
+
+    def __init__(self, max_rate: float, max_credits: float = 10.0) -> None:
+        self.max_rate = max_rate
+        self.max_credits = max_credits
+        self._credits = 0.0
+
+    def earn(self) -> None:
+        self._credits = min(self.max_credits, self._credits + self.max_rate)
+
+    def try_spend(self) -> bool:
+        if self._credits < 1:
+            return False
+        self._credits -= 1
+        return True
+
+
+class HedgeMetrics:
+    """Counters describing how hedging behaves in this process"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+        self.first_token_timeouts = 0
+
+    def snapshot(self, tracker: LatencyTracker) -> Dict[str, Any]:
+        def ms(p: float) -> Optional[float]:
+            value = tracker.percentile(p)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+            "first_token_timeouts": self.first_token_timeouts,
+            "ttft_p50_ms": ms(50),
+            "ttft_p95_ms": ms(95),
+            "ttft_p99_ms": ms(99),
+        }
+
+
+async def _close(stream: AsyncIterator[Any]) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception as e:
+            logger.debug(f"Closing a losing LLM stream failed: {str(e)}")
+
+
+async def first_chunk(
+    primary: StreamFactory,
+    hedge: Optional[StreamFactory],
+    hedge_after: float,
+    timeout: float,
+    may_hedge: Callable[[], bool],
+) -> Tuple[AsyncIterator[Any], Any, bool]:
+    """Race a primary stream against a delayed hedge for the first chunk.
+
+    Starts `primary`; if it has not produced a chunk after `hedge_after`
+    seconds and `may_hedge()` agrees, starts `hedge` as well. Whichever
+    yields first wins and the other is cancelled and closed. If one fails
+    while the other is still running, the survivor is awaited instead.
+
+    Returns (winning stream, its first chunk, whether the hedge won). An
+    empty winning stream is reported as StopAsyncIteration; asyncio.TimeoutError
+    is raised if neither produces anything within `timeout`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    streams = [primary()]
+    pending: Dict[asyncio.Future, int] = {asyncio.ensure_future(streams[0].__anext__()): 0}
+    hedge_at: Optional[float] = loop.time() + hedge_after if hedge is not None else None
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            wake_at = deadline if hedge_at is None else min(hedge_at, deadline)
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=max(0.0, wake_at - loop.time()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                if hedge_at is not None and loop.time() < deadline:
+                    hedge_at = None
+                    if may_hedge():
+                        streams.append(hedge())
+                        pending[asyncio.ensure_future(streams[1].__anext__())] = 1
+                    continue
+                raise asyncio.TimeoutError()
+            for future in done:
+                index = pending.pop(future)
+                if future.exception() is None:
+                    return streams[index], future.result(), index == 1
+                if isinstance(future.exception(), StopAsyncIteration):
+                    # An empty response is still an answer
+                    raise StopAsyncIteration
+                error = error or future.exception()
+            if not pending and hedge_at is not None and loop.time() < deadline:
+                # The primary failed fast; a hedge is now a retry, not a race
+                hedge_at = None
+                if may_hedge():
+                    streams.append(hedge())
+                    pending[asyncio.ensure_future(streams[1].__anext__())] = 1
+        raise error
+    finally:
+        for future in pending:
+            future.cancel()
+        for future, index in pending.items():
+            try:
+                await future
+            except BaseException:
+                pass
+            await _close(streams[index])
+
+
+class Hedger:
+    """Hedging policy plus the state it learns from: latency, budget and metrics"""
+
+    def __init__(
+        self,
+        percentile: float,
+        initial_delay: float,
+        min_delay: float,
+        max_rate: float,
+    ) -> None:
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.tracker = LatencyTracker()
+        self.budget = HedgeBudget(max_rate)
+        self.metrics = HedgeMetrics()
+
+    def hedge_delay(self) -> float:
+        observed = self.tracker.percentile(self.percentile)
+        return max(self.min_delay, observed if observed is not None else self.initial_delay)
+
+    def _may_hedge(self) -> bool:
+        if self.budget.try_spend():
+            self.metrics.hedged += 1
+            return True
+        self.metrics.budget_denied += 1
+        return False
+
+    async def first_chunk(
+        self, primary: StreamFactory, hedge: Optional[StreamFactory], timeout: float
+    ) -> Tuple[AsyncIterator[Any], Any]:
+        """first_chunk() with this policy's deadline and budget, recording the outcome"""
+        self.metrics.requests += 1
+        self.budget.earn()
+        started = time.perf_counter()
+        try:
+            stream, chunk, hedge_won = await first_chunk(
+                primary, hedge, self.hedge_delay(), timeout, self._may_hedge
+            )
+        except asyncio.TimeoutError:
+            self.metrics.first_token_timeouts += 1
+            raise
+        self.tracker.record(time.perf_counter() - started)
+        if hedge_won:
+            self.metrics.hedge_wins += 1
+        return stream, chunk
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            **self.metrics.snapshot(self.tracker),
+        }
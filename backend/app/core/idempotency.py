@@ -0,0 +1,95 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.single_flight import SingleFlight
+from app.models.idempotency import IdempotencyKey
+
+# Generations started by keyed requests, so retries can re-attach to them
+idempotent_replies = SingleFlight()
+
+
+def request_fingerprint(*parts: str) -> str:
+    """Hash of what a request asks for, to detect a key reused for something else"""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _created_at(record: IdempotencyKey) -> datetime:
+    created_at = record.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at
+
+
+def is_expired(record: IdempotencyKey) -> bool:
+    ttl = timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    return _created_at(record) < datetime.now(timezone.utc) - ttl
+
+
+def purge_expired_keys(db: Session) -> int:
+    """Delete keys past their TTL; claim_key only replaces the ones that get reused"""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    purged = (
+        db.query(IdempotencyKey)
+        .filter(IdempotencyKey.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return purged
+
+
+def is_abandoned(record: IdempotencyKey) -> bool:
+    """An in-progress request older than any generation can take has died"""
+    deadline = timedelta(seconds=settings.LLM_TOTAL_TIMEOUT_SECONDS * 2)
+    return _created_at(record) < datetime.now(timezone.utc) - deadline
+
+
+def claim_key(
+    db: Session, user_id: str, key: str, fingerprint: str
+) -> Tuple[IdempotencyKey, bool]:
+    """Return the record for `key`, creating it if this is the first request.
+
+    The boolean is True when the record was just created. Raises 422 if the
+    key was already used for a different request.
+    """
+    record = db.get(IdempotencyKey, (user_id, key))
+    if record is not None and is_expired(record):
+        db.delete(record)
+        db.commit()
+        record = None
+
+    if record is None:
+        record = IdempotencyKey(user_id=user_id, key=key, request_hash=fingerprint)
+        db.add(record)
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent request with the same key won the race
+            db.rollback()
+            raise in_progress_error()
+        db.refresh(record)
+        return record, True
+
+    if record.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    return record, False
+
+
+def in_progress_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still in progress",
+        headers={"Retry-After": "1"},
+    )
+
+
+def scoped_key(user_id: str, key: str) -> str:
+    return f"{user_id}:{key}"
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator
+
+from fastapi import FastAPI
+
+from app.config import settings
+from app.core.archival import run_archival
+from app.core.batch_jobs import batch_runner
+from app.core.idempotency import purge_expired_keys
+from app.core.llm_service import llm_service
+from app.core.related_index import related_index
+from app.core.title_batcher import title_batcher
+from app.database import SessionLocal, get_engine, replica_router, warm_pool
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Readiness flag plus a per-phase timing report for the current process"""
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.timings_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.warnings: Dict[str, str] = {}
+
+    @contextmanager
+    def phase(self, name: str, required: bool = True) -> Iterator[None]:
+        """Time a startup phase, recording (not raising) any failure.
+
+        Failures of required phases keep the instance out of rotation;
+        optional ones are only reported.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            message = str(e) or type(e).__name__
+            logger.error(f"Startup phase '{name}' failed: {message}")
+            (self.errors if required else self.warnings)[name] = message
+        finally:
+            self.timings_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def report(self) -> Dict[str, Any]:
+        # Only phase names are exposed; the messages are in the startup log
+        return {
+            "ready": self.ready,
+            "timings_ms": self.timings_ms,
+            "failed": sorted(self.errors),
+            "degraded": sorted(self.warnings),
+        }
+
+
+startup_state = StartupState()
+
+
+def _archive_once() -> None:
+    db = SessionLocal()
+    try:
+        run_archival(db)
+    finally:
+        db.close()
+
+
+async def archive_periodically(interval_minutes: int) -> None:
+    """Move idle chats to the archive table on a fixed interval"""
+    while True:
+        await asyncio.sleep(interval_minutes * 60)
+        try:
+            await asyncio.to_thread(_archive_once)
+        except Exception as e:
+            logger.error(f"Chat archival failed: {str(e)}")
+
+
+def _purge_keys_once() -> None:
+    db = SessionLocal()
+    try:
+        purged = purge_expired_keys(db)
+    finally:
+        db.close()
+    if purged:
+        logger.info(f"Purged {purged} expired idempotency keys")
+
+
+async def purge_keys_periodically(interval_minutes: int) -> None:
+    """Delete expired idempotency keys now and then on a fixed interval"""
+    while True:
+        try:
+            await asyncio.to_thread(_purge_keys_once)
+        except Exception as e:
+            logger.error(f"Idempotency key purge failed: {str(e)}")
+        await asyncio.sleep(interval_minutes * 60)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build and warm shared resources before the instance reports ready"""
+    started = time.perf_counter()
+
+    async def init_db() -> None:
+        with startup_state.phase("db_pool"):
+            engine = get_engine()
+            await asyncio.to_thread(warm_pool, engine, settings.DB_WARM_CONNECTIONS)
+        # Reads fall back to the primary, so replicas are not required for readiness
+        for index, replica in enumerate(replica_router.engines):
+            with startup_state.phase(f"db_replica_{index}", required=False):
+                await asyncio.to_thread(warm_pool, replica, settings.DB_WARM_CONNECTIONS)
+
+    async def init_llm() -> None:
+        with startup_state.phase("llm_client"):
+            # Importing the provider SDK is blocking and slow; keep it off the loop
+            await asyncio.to_thread(lambda: llm_service.client)
+            if llm_service.init_error:
+                raise RuntimeError(llm_service.init_error)
+        if "llm_client" in startup_state.errors:
+            return
+        # A failed warm-up only costs the first request a handshake
+        with startup_state.phase("llm_channel", required=False):
+            await asyncio.wait_for(
+                llm_service.warm_up(), timeout=settings.LLM_WARMUP_TIMEOUT_SECONDS
+            )
+
+    await asyncio.gather(init_db(), init_llm())
+
+    startup_state.timings_ms["lifespan_total"] = round(
+        (time.perf_counter() - started) * 1000, 1
+    )
+    startup_state.ready = not startup_state.errors
+    logger.info(f"Startup report: {startup_state.report()}")
+
+    background = [asyncio.create_task(llm_service.keep_warm())]
+    if settings.ARCHIVE_INTERVAL_MINUTES > 0:
+        background.append(
+            asyncio.create_task(archive_periodically(settings.ARCHIVE_INTERVAL_MINUTES))
+        )
+    if settings.IDEMPOTENCY_PURGE_INTERVAL_MINUTES > 0:
+        background.append(
+            asyncio.create_task(
+                purge_keys_periodically(settings.IDEMPOTENCY_PURGE_INTERVAL_MINUTES)
+            )
+        )
+    if settings.BATCH_RUN_IN_WEB:
+        batch_runner.start()
+
+    yield
+
+    startup_state.ready = False
+    for task in background:
+        task.cancel()
+    await batch_runner.close()
+    await title_batcher.close()
+    await related_index.close()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+    replica_router.dispose()
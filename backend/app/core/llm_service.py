@@ -1,107 +1,355 @@
+import asyncio
 import logging
-from app.core.prompts import TITLE_GENERATION_PROMPT, CORE_SYSTEM_PROMPT
-from typing import AsyncGenerator
+import time
+from functools import partial
+from app.core.prompts import (
+    TITLE_GENERATION_PROMPT,
+    BATCH_TITLE_GENERATION_PROMPT,
+    build_core_system_prompt,
+)
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Sequence
 from app.config import settings
-from langchain_google_genai import ChatGoogleGenerativeAI
+from app.core.hedging import Hedger
+from app.core.model_router import TITLE, classify, model_router
+from app.core.profiling import profile_phase
 from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _keepalive_channel_options() -> list:
+    """gRPC channel options that keep the provider connection open while idle"""
+    return [
+        ("grpc.keepalive_time_ms", settings.LLM_KEEPALIVE_SECONDS * 1000),
+        ("grpc.keepalive_timeout_ms", settings.LLM_KEEPALIVE_TIMEOUT_SECONDS * 1000),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+    ]
+
+
+def clean_title(raw: str) -> str:
+    """Normalize model output into a chat title"""
+    # Extract first line as title and strip whitespace
+    title = raw.strip().split("\n")[0].strip()
+    if not title:
+        return "Untitled Chat"
+    # Handle long titles by truncating with ellipses
+    words = title.split()
+    if len(words) > 7:
+        title = " ".join(words[:7]) + "..."
+    return title
+
+
+class TitleBatch(BaseModel):
+    """Structured output for batched title generation"""
+
+    titles: List[str]
+
+
 class LLMService:
     """Service for interacting with Gemini via LangChain"""
 
     def __init__(self):
         self.api_key = settings.LLM_API_KEY
         self.model = settings.LLM_MODEL
-        try:
-            self.client = ChatGoogleGenerativeAI(
-                api_key=self.api_key, model=self.model, disable_streaming=False
+        self._client = None
+        # Chat models for routed models other than LLM_MODEL
+        self._clients: Dict[str, Any] = {}
+        self.init_error: Optional[str] = None
+        self._last_used = time.monotonic()
+        # One per model tier, so fast-model latencies don't set full-model deadlines
+        self._hedgers: Dict[str, Hedger] = {}
+
+    @property
+    def client(self) -> Optional[Any]:
+        """LangChain chat model, built on first use (normally during startup)"""
+        if self._client is None and self.init_error is None:
+            try:
+                self._client = self._build_client()
+            except Exception as e:
+                logger.error(f"Error initializing LangChain Gemini: {str(e)}")
+                self.init_error = str(e)
+        return self._client
+
+    def _build_client(self, model: Optional[str] = None) -> Any:
+        # Imported here because the Gemini/gRPC stack dominates cold-start time
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        if not self.api_key:
+            raise ValueError("LLM_API_KEY is not set")
+        return ChatGoogleGenerativeAI(
+            api_key=self.api_key,
+            model=model or self.model,
+            disable_streaming=False,
+            # Deadline for the whole call, enforced by gRPC
+            timeout=settings.LLM_TOTAL_TIMEOUT_SECONDS,
+        )
+
+    def _ensure_async_client(self, client: Any) -> Any:
+        """Install one long-lived async gRPC client with keepalive on the model.
+
+        LangChain would otherwise build its own async client with default
+        channel options. Must run inside the event loop that will use it.
+        """
+        if client.async_client_running is None:
+            from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+                GenerativeServiceGrpcAsyncIOTransport,
             )
-        except Exception as e:
-            logger.error(f"Error initializing LangChain Gemini: {str(e)}")
-            self.client = None
+            from langchain_google_genai import _genai_extension as genaix
+            from langchain_google_genai._common import get_client_info
+
+            def create_channel(host: str, options: Optional[list] = None, **kwargs: Any):
+                return GenerativeServiceGrpcAsyncIOTransport.create_channel(
+                    host, options=(options or []) + _keepalive_channel_options(), **kwargs
+                )
+
+            client.async_client_running = genaix.build_generative_async_service(
+                credentials=None,
+                api_key=self.api_key,
+                client_info=get_client_info(f"ChatGoogleGenerativeAI:{client.model}"),
+                transport=partial(GenerativeServiceGrpcAsyncIOTransport, channel=create_channel),
+            )
+        self._last_used = time.monotonic()
+        return client
+
+    async def _ensure_connected(self) -> None:
+        """Wait up to LLM_CONNECT_TIMEOUT_SECONDS for the shared channel to connect.
+
+        A no-op while the channel is connected. Otherwise a request would
+        spend its first-token budget on the handshake, and a provider that
+        cannot be reached would only fail once that budget ran out.
+        """
+        import grpc
+
+        channel = self._ensure_async_client(self.client).async_client_running.transport.grpc_channel
+        if channel.get_state(try_to_connect=True) != grpc.ChannelConnectivity.READY:
+            await asyncio.wait_for(
+                channel.channel_ready(), timeout=settings.LLM_CONNECT_TIMEOUT_SECONDS
+            )
+
+    def _client_for(self, model: str) -> Any:
+        """Chat model for `model`, sharing the primary's gRPC channel"""
+        client = self._ensure_async_client(self.client)
+        if model == self.model:
+            return client
+        if model not in self._clients:
+            self._clients[model] = self._build_client(model)
+        routed = self._clients[model]
+        if routed.async_client_running is None:
+            # The async service is model-agnostic; the model travels in each request
+            routed.async_client_running = client.async_client_running
+        return routed
+
+    def _hedger(self, tier: str) -> Hedger:
+        if tier not in self._hedgers:
+            self._hedgers[tier] = Hedger(
+                percentile=settings.LLM_HEDGE_PERCENTILE,
+                initial_delay=settings.LLM_HEDGE_INITIAL_DELAY_MS / 1000,
+                min_delay=settings.LLM_HEDGE_MIN_DELAY_MS / 1000,
+                max_rate=settings.LLM_HEDGE_MAX_RATE,
+            )
+        return self._hedgers[tier]
+
+    def metrics(self) -> dict:
+        """Process-local LLM metrics: per-tier usage and latency, and hedging"""
+        return {
+            "tiers": model_router.snapshot(),
+            "first_token": {tier: hedger.snapshot() for tier, hedger in self._hedgers.items()},
+        }
+
+    async def warm_up(self) -> None:
+        """Build the client and open the async provider channel.
+
+        A token-count call is enough to establish the gRPC channel and TLS
+        session without paying for a generation.
+        """
+        client = self.client
+        if client is None:
+            raise RuntimeError(self.init_error or "LLM client unavailable")
+        async_client = self._ensure_async_client(client).async_client_running
+        if not settings.LLM_WARMUP:
+            return
+        await self._ensure_connected()
+        await async_client.count_tokens(
+            request={
+                "model": client.model,
+                "contents": [{"role": "user", "parts": [{"text": "ping"}]}],
+            },
+            timeout=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+        )
+
+    async def keep_warm(self) -> None:
+        """Ping the provider whenever the channel has been idle for a while.
+
+        Runs until cancelled; disabled when LLM_IDLE_PING_SECONDS is 0.
+        """
+        interval = settings.LLM_IDLE_PING_SECONDS
+        if interval <= 0:
+            return
+        while True:
+            idle = time.monotonic() - self._last_used
+            if idle < interval:
+                await asyncio.sleep(interval - idle)
+                continue
+            try:
+                await self.warm_up()
+            except Exception as e:
+                logger.warning(f"LLM idle ping failed: {str(e) or type(e).__name__}")
+                self._last_used = time.monotonic()
+
+    @staticmethod
+    def _system_prompt(context: Optional[list], levels: Optional[Sequence[str]]) -> str:
+        """Core system prompt with chat history and the requested explanation levels"""
+        chat_history = (
+            "\n".join(f"{msg['role']}: {msg['content']}" for msg in context[-5:])
+            if context
+            else "No previous messages"
+        )
+        return build_core_system_prompt(chat_history, levels)
 
     async def generate_response(
-        self, query: str, title_mode: bool = False, context: list = None
+        self,
+        query: str,
+        title_mode: bool = False,
+        context: list = None,
+        levels: Optional[Sequence[str]] = None,
     ) -> str:
         if not self.client:
             return "LLM service is not properly configured. Please check server logs."
+        self._ensure_async_client(self.client)
         try:
             if title_mode:
-                # Generate a concise title based on the first user message
-                prompt = ChatPromptTemplate.from_messages(
-                    [("system", TITLE_GENERATION_PROMPT), ("human", "{input}")]
-                )
-                chain = prompt | self.client
-                result = await chain.ainvoke({"input": query})
-                # Extract first line as title and strip whitespace
-                title = result.content.strip().split("\n")[0].strip()
-                # Handle long titles by truncating with ellipses
-                if not title:
-                    return "Untitled Chat"
-                words = title.split()
-                if len(words) > 7:
-                    title = " ".join(words[:7]) + "..."
-                return title
+                return await self.generate_title(query)
             # Regular conversation response
-            formatted_system_prompt = CORE_SYSTEM_PROMPT.format(
-                chat_history=(
-                    "\n".join(
-                        f"{msg['role']}: {msg['content']}"
-                        for msg in (context[-5:] if context else [])
-                    )
-                    if context
-                    else "No previous messages"
-                )
-            )
-            prompt = ChatPromptTemplate.from_messages(
-                [("system", formatted_system_prompt), ("human", "{input}")]
-            )
-            chain = prompt | self.client
-            result = await chain.ainvoke({"input": query})
-            return result.content
+            return await self.generate_explanation(query, context, levels)
         except Exception as e:
             logger.error(f"Error generating Gemini response: {str(e)}")
             return f"Error generating response: {str(e)}"
 
+    async def generate_explanation(
+        self,
+        query: str,
+        context: list = None,
+        levels: Optional[Sequence[str]] = None,
+    ) -> str:
+        """Generate a complete (non-streamed) explanation (raises on failure)"""
+        if not self.client:
+            raise RuntimeError(self.init_error or "LLM client unavailable")
+        route = classify(query, context)
+        prompt = ChatPromptTemplate.from_messages(
+            [("system", self._system_prompt(context, levels)), ("human", "{input}")]
+        )
+        await self._ensure_connected()
+        chain = prompt | self._client_for(model_router.model_for(route))
+        with model_router.track(route) as stats:
+            result = await chain.ainvoke({"input": query})
+            stats.add_usage(result)
+        return result.content
+
+    async def generate_title(self, query: str) -> str:
+        """Generate a concise title based on the first user message (raises on failure)"""
+        if not self.client:
+            raise RuntimeError(self.init_error or "LLM client unavailable")
+        prompt = ChatPromptTemplate.from_messages(
+            [("system", TITLE_GENERATION_PROMPT), ("human", "{input}")]
+        )
+        await self._ensure_connected()
+        chain = prompt | self._client_for(model_router.model_for(TITLE))
+        with profile_phase("llm_title"), model_router.track(TITLE) as stats:
+            result = await chain.ainvoke({"input": query})
+            stats.add_usage(result)
+        return clean_title(result.content)
+
+    async def generate_titles(self, queries: List[str]) -> List[str]:
+        """Title several first messages with one structured-output call.
+
+        Raises ValueError if the model does not return exactly one title per
+        query, so callers can fall back to per-item generation.
+        """
+        if not self.client:
+            raise RuntimeError(self.init_error or "LLM client unavailable")
+        prompt = ChatPromptTemplate.from_messages(
+            [("system", BATCH_TITLE_GENERATION_PROMPT), ("human", "{input}")]
+        )
+        await self._ensure_connected()
+        client = self._client_for(model_router.model_for(TITLE))
+        # include_raw keeps the raw message, which carries the token usage
+        chain = prompt | client.with_structured_output(TitleBatch, include_raw=True)
+        numbered = "\n".join(f"{i}. {query}" for i, query in enumerate(queries, 1))
+        with model_router.track(TITLE) as stats:
+            output = await chain.ainvoke({"input": numbered})
+            stats.add_usage(output["raw"])
+        result = output["parsed"]
+        if not isinstance(result, TitleBatch) or len(result.titles) != len(queries):
+            raise ValueError("Batched title output did not match the number of queries")
+        return [clean_title(title) for title in result.titles]
+
     async def generate_response_stream(
-        self, query: str, context: list = None
+        self, query: str, context: list = None, levels: Optional[Sequence[str]] = None
     ) -> AsyncGenerator[str, None]:
-        """Stream response tokens from the LLM"""
+        """Stream response tokens from the LLM.
+
+        Failures are raised rather than streamed as text, so callers can tell
+        an error from an answer and avoid saving it as the reply.
+        """
         if not self.client:
-            yield "LLM service is not properly configured. Please check server logs."
-            return
+            raise RuntimeError(self.init_error or "LLM client unavailable")
 
         try:
+            # Small talk is served by the fast tier, everything else by the full model
+            route = classify(query, context)
+            model = model_router.model_for(route)
+
             # Format system prompt with chat history if available
-            formatted_system_prompt = CORE_SYSTEM_PROMPT.format(
-                chat_history=(
-                    "\n".join(
-                        f"{msg['role']}: {msg['content']}"
-                        for msg in (context[-5:] if context else [])
-                    )
-                    if context
-                    else "No previous messages"
-                )
-            )
+            formatted_system_prompt = self._system_prompt(context, levels)
 
             # Build the prompt
             messages = [("system", formatted_system_prompt), ("human", "{input}")]
             prompt = ChatPromptTemplate.from_messages(messages)
-            chain = prompt | self.client
-
-            # Stream the response
-            async for chunk in chain.astream({"input": query}):
-                if hasattr(chunk, "content"):
-                    yield chunk.content
-                else:
-                    # Handle different chunk types
-                    yield str(chunk)
+
+            await self._ensure_connected()
+
+            def start(client: Any) -> Callable[[], AsyncIterator[Any]]:
+                return lambda: (prompt | client).astream({"input": query}).__aiter__()
+
+            hedge = (
+                start(self._client_for(settings.LLM_HEDGE_MODEL or model))
+                if settings.LLM_HEDGING
+                else None
+            )
+
+            hedger = self._hedger(model_router.tier_for(route))
+
+            with model_router.track(route) as stats:
+                # Stream the response, bounding the wait for the first chunk; a
+                # slow first token may be hedged with a second request
+                try:
+                    with profile_phase("llm_first_token"):
+                        stream, chunk = await hedger.first_chunk(
+                            start(self._client_for(model)),
+                            hedge,
+                            settings.LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+                        )
+                except StopAsyncIteration:
+                    return
+                stats.first_token()
+                logger.debug(f"LLM time to first token ({model}): {stats.ttft * 1000:.0f}ms")
+                while True:
+                    stats.add_usage(chunk)
+                    if hasattr(chunk, "content"):
+                        yield chunk.content
+                    else:
+                        # Handle different chunk types
+                        yield str(chunk)
+                    try:
+                        chunk = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
         except Exception as e:
             logger.error(f"Error generating streaming response: {str(e)}")
-            yield f"Error generating response: {str(e)}"
+            raise
 
 
 llm_service = LLMService()
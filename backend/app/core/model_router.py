@@ -0,0 +1,144 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from app.config import settings
+from app.core.hedging import LatencyTracker
+
+# Routes: what a call is for. Tiers: which class of model serves it.
+TITLE = "title"
+SHORT = "short"
+EXPLANATION = "explanation"
+ROUTE_TIERS = {TITLE: "fast", SHORT: "fast", EXPLANATION: "full"}
+
+# Greetings, thanks and acknowledgements; a message made only of these words
+# is small talk and doesn't need the full model
+_SMALL_TALK_WORDS = {
+    "hi", "hello", "hey", "hiya", "howdy", "yo", "good", "morning", "afternoon",
+    "evening", "thanks", "thank", "thx", "ty", "you", "so", "much", "a", "lot",
+    "ok", "okay", "k", "cool", "great", "nice", "awesome", "perfect", "amazing",
+    "wow", "got", "it", "makes", "sense", "bye", "goodbye", "cheers", "yes",
+    "yeah", "yep", "no", "nope", "sure", "lol", "again", "there", "that's",
+    "appreciate", "appreciated", "helpful", "very",
+}
+# Small talk on its own, but a request to continue or repeat when it answers
+# an earlier message ("yes", "again")
+_FOLLOW_UP_WORDS = {"again", "sure", "yes", "yeah", "yep", "no", "nope"}
+_SMALL_TALK_MAX_WORDS = 8
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def classify(query: str, context: Optional[Sequence[Any]] = None) -> str:
+    """Route a chat message: small talk goes to SHORT, anything else to EXPLANATION.
+
+    Deliberately conservative: a short question like "why?", a bare topic
+    like "black holes", a follow-up like "again" in an ongoing chat and
+    anything without recognizable words (other scripts, emoji) still get a
+    full explanation.
+    """
+    words = _WORD_RE.findall(query.lower())
+    if not words or len(words) > _SMALL_TALK_MAX_WORDS:
+        return EXPLANATION
+    if not all(w in _SMALL_TALK_WORDS for w in words):
+        return EXPLANATION
+    if context and any(w in _FOLLOW_UP_WORDS for w in words):
+        return EXPLANATION
+    return SHORT
+
+
+class CallStats:
+    """Measurements of one routed call, filled in while it runs"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def first_token(self) -> None:
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def add_usage(self, message: Any) -> None:
+        """Add token usage reported on a LangChain message or stream chunk"""
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+
+
+class TierMetrics:
+    def __init__(self) -> None:
+        self.calls: Counter = Counter()  # by route
+        self.models: Counter = Counter()
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency = LatencyTracker(min_samples=1)
+        self.ttft = LatencyTracker(min_samples=1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        def ms(tracker: LatencyTracker, p: float) -> Optional[float]:
+            value = tracker.percentile(p)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "calls": dict(self.calls),
+            "models": dict(self.models),
+            "errors": self.errors,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_p50_ms": ms(self.latency, 50),
+            "latency_p95_ms": ms(self.latency, 95),
+            "ttft_p50_ms": ms(self.ttft, 50),
+            "ttft_p95_ms": ms(self.ttft, 95),
+        }
+
+
+class ModelRouter:
+    """Maps routes to model tiers and models, and keeps per-tier metrics"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, TierMetrics] = {}
+
+    def tier_for(self, route: str) -> str:
+        return ROUTE_TIERS[route] if settings.LLM_MODEL_ROUTING else "full"
+
+    def model_for(self, route: str) -> str:
+        if not settings.LLM_MODEL_ROUTING:
+            return settings.LLM_MODEL
+        override = {
+            TITLE: settings.LLM_TITLE_MODEL,
+            SHORT: settings.LLM_SHORT_MODEL,
+            EXPLANATION: settings.LLM_EXPLANATION_MODEL,
+        }[route]
+        if override:
+            return override
+        return settings.LLM_FAST_MODEL if ROUTE_TIERS[route] == "fast" else settings.LLM_MODEL
+
+    @contextmanager
+    def track(self, route: str) -> Iterator[CallStats]:
+        """Record latency, time to first token and token usage of one call"""
+        tier = self.tier_for(route)
+        metrics = self._metrics.setdefault(tier, TierMetrics())
+        metrics.calls[route] += 1
+        metrics.models[self.model_for(route)] += 1
+        stats = CallStats()
+        try:
+            yield stats
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.latency.record(time.perf_counter() - stats.started)
+            if stats.ttft is not None:
+                metrics.ttft.record(stats.ttft)
+            metrics.input_tokens += stats.input_tokens
+            metrics.output_tokens += stats.output_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {tier: metrics.snapshot() for tier, metrics in self._metrics.items()}
+
+
+model_router = ModelRouter()
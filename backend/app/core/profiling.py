@@ -0,0 +1,334 @@
+import asyncio
+import hmac
+import inspect
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.request_profile import StoredProfile
+
+logger = logging.getLogger(__name__)
+
+# Carries the admin token, both to profile a request and to read profiles
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+# Reading profiles is not itself profiled, so it never evicts what it reads
+PROFILES_PATH = f"{settings.API_V1_STR}/profiles"
+
+
+class StackSampler:
+    """Samples the stacks of the threads handling one request into folded stacks.
+
+    Only threads registered with track() are sampled. The event loop thread
+    is registered with the request's task and sampled only while that task
+    is the one running, so other requests' coroutines and an idle loop are
+    left out; a threadpool thread is sampled while it runs the request's
+    sync endpoint.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.samples: Counter = Counter()
+        # Thread ident -> (loop, task) the thread must be running to be sampled
+        self._threads: Dict[int, Tuple[Optional[asyncio.AbstractEventLoop], Optional[asyncio.Task]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(
+        self,
+        ident: int,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        task: Optional[asyncio.Task] = None,
+    ) -> None:
+        self._threads[ident] = (loop, task)
+
+    def untrack(self, ident: int) -> None:
+        self._threads.pop(ident, None)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, (loop, task) in list(self._threads.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                if task is not None and asyncio.current_task(loop) is not task:
+                    # The loop is idle or running another request
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+
+class RequestProfile:
+    """Per-phase timings, SQL totals and stack samples for one request"""
+
+    def __init__(self, method: str, path: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.created_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.phases: List[Dict[str, Any]] = []
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.sampler = StackSampler(settings.PROFILING_INTERVAL_MS / 1000)
+
+    def add_phase(self, name: str, started: float, ended: float) -> None:
+        self.phases.append(
+            {
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 2),
+                "duration_ms": round((ended - started) * 1000, 2),
+            }
+        )
+
+    def folded(self) -> str:
+        """Folded stacks, importable by speedscope and flamegraph.pl"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.sampler.samples.items())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "created_at": self.created_at,
+            "duration_ms": self.duration_ms,
+            "phases": self.phases,
+            "sql": {"count": self.sql_count, "duration_ms": round(self.sql_ms, 2)},
+            "samples": sum(self.sampler.samples.values()),
+        }
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "current_profile", default=None
+)
+
+
+@contextmanager
+def _sampling_this_thread() -> Iterator[None]:
+    """Sample the calling (threadpool) thread while the block runs, if profiling"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profile.sampler.track(ident)
+    try:
+        yield
+    finally:
+        profile.sampler.untrack(ident)
+
+
+@contextmanager
+def profile_phase(name: str) -> Iterator[None]:
+    """Record how long the enclosed block took, if the request is being profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, started, time.perf_counter())
+
+
+class ProfileStore:
+    """The most recent profiles, kept in the database so any worker can serve them"""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+
+    def add(self, profile: RequestProfile) -> None:
+        """Save a finished profile, dropping the oldest beyond max_size"""
+        db = SessionLocal()
+        try:
+            db.add(
+                StoredProfile(
+                    id=profile.id,
+                    created_at=datetime.fromtimestamp(profile.created_at, timezone.utc),
+                    summary=profile.summary(),
+                    folded=profile.folded(),
+                )
+            )
+            db.flush()
+            oldest_kept = (
+                db.query(StoredProfile.created_at)
+                .order_by(StoredProfile.created_at.desc())
+                .offset(self.max_size - 1)
+                .limit(1)
+                .scalar()
+            )
+            if oldest_kept is not None:
+                db.query(StoredProfile).filter(
+                    StoredProfile.created_at < oldest_kept
+                ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def get(self, db: Session, profile_id: str) -> Optional[StoredProfile]:
+        return db.query(StoredProfile).filter(StoredProfile.id == profile_id).first()
+
+    def list(self, db: Session) -> List[StoredProfile]:
+        return (
+            db.query(StoredProfile)
+            .order_by(StoredProfile.created_at.desc())
+            .limit(self.max_size)
+            .all()
+        )
+
+
+profile_store = ProfileStore(settings.PROFILING_MAX_STORED)
+
+
+def is_profiling_admin(token: Optional[str]) -> bool:
+    admin_token = settings.PROFILING_ADMIN_TOKEN
+    return bool(admin_token and token and hmac.compare_digest(token, admin_token))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = _current_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is not None and starts:
+        profile.sql_count += 1
+        profile.sql_ms += (time.perf_counter() - starts.pop()) * 1000
+
+
+class ProfiledRoute(APIRoute):
+    """Times dependency resolution, the endpoint body and response serialization"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        call = self.dependant.call
+
+        if call is not None and not getattr(call, "_profiled", False):
+            if inspect.iscoroutinefunction(call):
+
+                async def timed_call(*args: Any, **kwargs: Any) -> Any:
+                    with profile_phase("endpoint"):
+                        return await call(*args, **kwargs)
+
+            else:
+
+                def timed_call(*args: Any, **kwargs: Any) -> Any:
+                    # Sync endpoints run in the threadpool, away from the loop thread
+                    with profile_phase("endpoint"), _sampling_this_thread():
+                        return call(*args, **kwargs)
+
+            timed_call._profiled = True
+            self.dependant.call = timed_call
+
+        async def profiled_handler(request):
+            profile = _current_profile.get()
+            if profile is None:
+                return await handler(request)
+            started = time.perf_counter()
+            response = await handler(request)
+            ended = time.perf_counter()
+            endpoint = next(
+                (phase for phase in reversed(profile.phases) if phase["name"] == "endpoint"),
+                None,
+            )
+            if endpoint is not None:
+                endpoint_start = profile.started + endpoint["start_ms"] / 1000
+                endpoint_end = endpoint_start + endpoint["duration_ms"] / 1000
+                profile.add_phase("dependencies", started, endpoint_start)
+                profile.add_phase("serialization", endpoint_end, ended)
+            return response
+
+        return profiled_handler
+
+
+class ProfilingMiddleware:
+    """Profiles requests carrying a valid X-Profile admin token, or a random sample.
+
+    Costs one header lookup per request when nothing is being profiled.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = Headers(scope=scope).get(PROFILE_HEADER)
+        sample_rate = settings.PROFILING_SAMPLE_RATE
+        if scope["path"].startswith(PROFILES_PATH) or not (
+            (requested is not None and is_profiling_admin(requested))
+            or (sample_rate > 0 and random.random() < sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current_profile.set(profile)
+        profile.sampler.track(
+            threading.get_ident(), asyncio.get_running_loop(), asyncio.current_task()
+        )
+        profile.sampler.start()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                MutableHeaders(scope=message)[PROFILE_ID_HEADER] = profile.id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.sampler.stop()
+            profile.duration_ms = round((time.perf_counter() - profile.started) * 1000, 2)
+            _current_profile.reset(token)
+            try:
+                await run_in_threadpool(profile_store.add, profile)
+            except Exception as e:
+                logger.error(f"Error saving profile {profile.id}: {str(e)}")
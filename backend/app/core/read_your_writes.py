@@ -0,0 +1,70 @@
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database import RequestWrites, replica_router, request_writes
+
+# Unix time until which the client's reads must go to the primary. Browsers
+# send the cookie back; other clients can echo the header instead.
+READ_PRIMARY_COOKIE = "read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+
+
+def reads_from_primary(connection: HTTPConnection) -> bool:
+    """Whether this request must read from the primary to see the client's own writes"""
+    value = connection.headers.get(READ_PRIMARY_HEADER) or connection.cookies.get(
+        READ_PRIMARY_COOKIE
+    )
+    try:
+        return float(value) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+
+class ReadYourWritesMiddleware:
+    """Tells clients that just wrote to read from the primary for a while.
+
+    Commits made while handling a request are recorded in `request_writes`;
+    if there were any, the response carries the time until which
+    get_read_db must use the primary, as a cookie and a header. Being kept
+    by the client, it holds whichever worker or instance serves the next
+    request. Streamed responses can keep writing after their headers are
+    sent (a reply is saved when it finishes), so their window also covers
+    the longest a generation may take.
+
+    Does nothing when no read replicas are configured.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not replica_router.urls:
+            await self.app(scope, receive, send)
+            return
+
+        writes = RequestWrites()
+        token = request_writes.set(writes)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and writes.wrote:
+                window = settings.REPLICA_STICKY_SECONDS
+                if "content-length" not in Headers(raw=message["headers"]):
+                    window += settings.LLM_TOTAL_TIMEOUT_SECONDS
+                until = f"{time.time() + window:.3f}"
+                headers = MutableHeaders(scope=message)
+                headers[READ_PRIMARY_HEADER] = until
+                headers.append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}={until}; Max-Age={int(window) + 1}; Path=/; "
+                    "HttpOnly; Secure; SameSite=None",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_writes.reset(token)
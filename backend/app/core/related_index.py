@@ -0,0 +1,542 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Set, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.archival import unpack_messages
+from app.database import SessionLocal
+from app.models.chat import Chat, ChatArchive, Message
+from app.models.chat_embedding import ChatEmbedding
+
+logger = logging.getLogger(__name__)
+
+# Only the start of long chats is embedded; the topic is set early on
+DOCUMENT_MAX_CHARS = 8000
+DOCUMENT_MESSAGES = 6
+REBUILD_BATCH_SIZE = 64
+# Embeddings written in transactions that committed out of timestamp order
+# are still picked up by an incremental sync if they are at most this late
+SYNC_LOOKBACK_SECONDS = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so a dot product is their cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class Embedder(Protocol):
+    # Stored with each index; an index built by a different embedder is rebuilt
+    name: str
+    dim: int
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Unit-length float32 vectors, one row per text"""
+        ...
+
+
+class HashingEmbedder:
+    """Local embedding by signed feature hashing of words and word bigrams.
+
+    Needs no network or model download and maps the same text to the same
+    vector every time, which makes it the development and test default.
+    It matches shared vocabulary rather than meaning.
+    """
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        # Pure Python hashing is CPU-bound; keep it off the event loop
+        return await run_in_threadpool(self._embed, texts)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN_RE.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        return normalize(vectors)
+
+
+class GeminiEmbedder:
+    """Embeddings from the Gemini API, truncated to `dim` dimensions"""
+
+    def __init__(self, model: str, dim: int) -> None:
+        self.model = model
+        self.dim = dim
+        self.name = f"{model}-{dim}"
+        self._client = None
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if self._client is None:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+            self._client = GoogleGenerativeAIEmbeddings(
+                model=self.model, google_api_key=settings.LLM_API_KEY
+            )
+        vectors = await self._client.aembed_documents(
+            texts, task_type="SEMANTIC_SIMILARITY", output_dimensionality=self.dim
+        )
+        return normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def build_embedder() -> Embedder:
+    if settings.EMBEDDING_PROVIDER == "local":
+        return HashingEmbedder(settings.EMBEDDING_DIM)
+    if settings.EMBEDDING_PROVIDER == "gemini":
+        return GeminiEmbedder(settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM)
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {settings.EMBEDDING_PROVIDER}")
+
+
+def chat_documents(db: Session, chat_ids: List[str]) -> Dict[str, str]:
+    """The text each chat is indexed by: its title, first query and first answers.
+
+    Only a chat's first DOCUMENT_MESSAGES messages are read. Loads the whole
+    batch with one chat query and one message query; chats that no longer
+    exist are left out.
+    """
+    chats = (
+        db.query(Chat.id, Chat.name, ChatArchive.payload)
+        .outerjoin(ChatArchive, ChatArchive.chat_id == Chat.id)
+        .filter(Chat.id.in_(chat_ids))
+        .all()
+    )
+    messages: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for chat_id, name, payload in chats:
+        if payload is not None:
+            messages[chat_id] = [
+                (m["role"], m["content"]) for m in unpack_messages(payload)[:DOCUMENT_MESSAGES]
+            ]
+    numbered = (
+        db.query(
+            Message.chat_id,
+            Message.role,
+            Message.content,
+            func.row_number()
+            .over(partition_by=Message.chat_id, order_by=Message.created_at)
+            .label("position"),
+        )
+        .filter(Message.chat_id.in_(chat_ids))
+        .subquery()
+    )
+    for chat_id, role, content in (
+        db.query(numbered.c.chat_id, numbered.c.role, numbered.c.content)
+        .filter(numbered.c.position <= DOCUMENT_MESSAGES)
+        .order_by(numbered.c.chat_id, numbered.c.position)
+    ):
+        messages[chat_id].append((role, content))
+
+    documents = {}
+    for chat_id, name, _ in chats:
+        rows = messages[chat_id]
+        first_query = next((content for role, content in rows if role == "user"), "")
+        answers = [content for role, content in rows if role == "assistant"]
+        documents[chat_id] = "\n\n".join([name or "", first_query, *answers])[:DOCUMENT_MAX_CHARS]
+    return documents
+
+
+def changes_document(db: Session, chat_id: str) -> bool:
+    """Whether the chat's latest message is one of those it is indexed by"""
+    count = db.query(func.count(Message.id)).filter(Message.chat_id == chat_id).scalar()
+    return count <= DOCUMENT_MESSAGES
+
+
+class _LRU:
+    """Dict bounded to the `maxsize` most recently used keys"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        if key in self._items:
+            self._items.move_to_end(key)
+        return self._items.get(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+def _in_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+class RelatedIndex:
+    """Per-user embedding index of past chats for "related explanations".
+
+    Embeddings are stored in the `chat_embeddings` table, so every process
+    (web or batch worker) sees chats indexed by any other. For search, each
+    process keeps a local copy of a user's vectors: a directory holding
+    `index.json` (embedder, database version, vector file name and the chat
+    id of every row) and a float16 vector file that is memory-mapped. When
+    the user's version in the database (number of embeddings and latest
+    update) no longer matches, the copy is brought up to date under an
+    exclusive file lock, so processes sharing the disk do not race: rows
+    updated since the last sync are overwritten in place and new ones are
+    appended. Only a missing copy, a changed embedder or deleted chats make
+    it rewrite everything into a new vector file, written before
+    `index.json` is swapped, so readers never see ids and vectors that
+    disagree. Storing an unchanged vector is skipped, so re-indexing a chat
+    whose document did not change costs no sync at all.
+
+    Chats without an embedding from the current embedder (new users, a
+    changed embedder, chats indexed before a crash) are embedded on first
+    search, in batches. The directory is a cache and can be discarded at
+    any time. Database and file work runs in the threadpool.
+    """
+
+    def __init__(self, root: Path, embedder: Embedder, max_users: int = 256) -> None:
+        self.root = root
+        self.embedder = embedder
+        # user id -> (version, row ids, memory-mapped vectors)
+        self._cache = _LRU(max_users)
+        self._cache_lock = threading.Lock()
+        # Per-user locks only deduplicate work within this process, so
+        # evicting one that is still held costs at most a repeated embed
+        self._locks = _LRU(max_users)
+        self._pending: Set[asyncio.Task] = set()
+
+    def _dir(self, user_id: str) -> Path:
+        return self.root / hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+
+    def _lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _version(self, db: Session, user_id: str) -> str:
+        count, latest = (
+            db.query(func.count(ChatEmbedding.chat_id), func.max(ChatEmbedding.updated_at))
+            .filter(ChatEmbedding.user_id == user_id, ChatEmbedding.embedder == self.embedder.name)
+            .one()
+        )
+        return f"{count}:{latest.isoformat() if latest else ''}"
+
+    def _read_local(
+        self, user_id: str, version: str
+    ) -> Optional[Tuple[List[str], np.ndarray]]:
+        """Row ids and memory-mapped vectors of the local copy, if it is at `version`"""
+        directory = self._dir(user_id)
+        try:
+            meta = json.loads((directory / "index.json").read_text())
+        except FileNotFoundError:
+            return None
+        if (
+            meta["version"] != version
+            or meta["embedder"] != self.embedder.name
+            or meta["dim"] != self.embedder.dim
+        ):
+            return None
+        ids = meta["ids"]
+        if not ids:
+            return ids, np.zeros((0, self.embedder.dim), dtype=np.float16)
+        try:
+            vectors = np.memmap(
+                directory / meta["vectors"],
+                dtype=np.float16,
+                mode="r",
+                shape=(len(ids), self.embedder.dim),
+            )
+        except FileNotFoundError:
+            # Replaced by another process between reading index.json and here
+            return None
+        return ids, vectors
+
+    def _sync_local(
+        self, db: Session, user_id: str, version: str
+    ) -> Tuple[List[str], np.ndarray]:
+        """Bring the local copy up to `version`, unless another process just did"""
+        directory = self._dir(user_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            loaded = self._read_local(user_id, version)
+            if loaded is not None:
+                return loaded
+            try:
+                meta = json.loads((directory / "index.json").read_text())
+            except FileNotFoundError:
+                meta = None
+            if (
+                meta is None
+                or meta["embedder"] != self.embedder.name
+                or meta["dim"] != self.embedder.dim
+                or not self._update_local(db, user_id, directory, meta, version)
+            ):
+                self._rebuild_local(db, user_id, directory, version)
+            return self._read_local(user_id, version)
+
+    def _rows(self, db: Session, user_id: str):
+        return db.query(
+            ChatEmbedding.chat_id, ChatEmbedding.vector, ChatEmbedding.updated_at
+        ).filter(ChatEmbedding.user_id == user_id, ChatEmbedding.embedder == self.embedder.name)
+
+    def _update_local(
+        self, db: Session, user_id: str, directory: Path, meta: dict, version: str
+    ) -> bool:
+        """Overwrite changed rows in place and append new ones.
+
+        Readers keep consistent ids: a row only ever holds its chat's
+        vector, and appended rows are beyond the ids they know about.
+        Returns False, leaving the copy for a rebuild, if chats were deleted.
+        """
+        if not meta.get("latest"):
+            return False
+        synced = datetime.fromisoformat(meta["latest"])
+        since = synced - timedelta(seconds=SYNC_LOOKBACK_SECONDS)
+        changed = self._rows(db, user_id).filter(ChatEmbedding.updated_at >= since).all()
+        ids = list(meta["ids"])
+        rows = {chat_id: row for row, chat_id in enumerate(ids)}
+        for chat_id, _, _ in changed:
+            if chat_id not in rows:
+                rows[chat_id] = len(ids)
+                ids.append(chat_id)
+        if len(ids) != int(version.split(":")[0]):
+            return False
+        row_size = self.embedder.dim * np.dtype(np.float16).itemsize
+        with open(directory / meta["vectors"], "r+b") as f:
+            for chat_id, vector, _ in changed:
+                f.seek(rows[chat_id] * row_size)
+                f.write(vector)
+        latest = max([synced, *(updated_at for _, _, updated_at in changed)])
+        self._write_meta(directory, meta["vectors"], ids, version, latest)
+        return True
+
+    def _rebuild_local(self, db: Session, user_id: str, directory: Path, version: str) -> None:
+        """Rewrite the local copy from the database into a new vector file"""
+        rows = self._rows(db, user_id).order_by(ChatEmbedding.chat_id).all()
+        old = {path.name for path in directory.glob("vectors-*.f16")}
+        vectors_name = f"vectors-{uuid.uuid4().hex}.f16"
+        with open(directory / vectors_name, "wb") as f:
+            for _, vector, _ in rows:
+                f.write(vector)
+        latest = max([updated_at for _, _, updated_at in rows], default=None)
+        ids = [chat_id for chat_id, _, _ in rows]
+        self._write_meta(directory, vectors_name, ids, version, latest)
+        for name in old:
+            # Open memmaps of the old file stay valid until they are dropped
+            (directory / name).unlink(missing_ok=True)
+
+    def _write_meta(
+        self,
+        directory: Path,
+        vectors_name: str,
+        ids: List[str],
+        version: str,
+        latest: Optional[datetime],
+    ) -> None:
+        meta = {
+            "embedder": self.embedder.name,
+            "dim": self.embedder.dim,
+            "version": version,
+            # Newest embedding in the copy, where the next incremental sync starts
+            "latest": latest.isoformat() if latest else None,
+            "vectors": vectors_name,
+            "ids": ids,
+        }
+        tmp = directory / f"index.json.{uuid.uuid4().hex}"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, directory / "index.json")
+
+    def _snapshot(self, user_id: str) -> Tuple[List[str], np.ndarray]:
+        """The user's row ids and vectors as of the current database version"""
+        db = SessionLocal()
+        try:
+            version = self._version(db, user_id)
+            with self._cache_lock:
+                cached = self._cache.get(user_id)
+            if cached is not None and cached[0] == version:
+                return cached[1], cached[2]
+            loaded = self._read_local(user_id, version) or self._sync_local(db, user_id, version)
+        finally:
+            db.close()
+        with self._cache_lock:
+            self._cache[user_id] = (version, *loaded)
+        return loaded
+
+    def _missing(self, db: Session, user_id: str) -> List[str]:
+        """The user's chats without an embedding from the current embedder"""
+        return [
+            chat_id
+            for (chat_id,) in db.query(Chat.id)
+            .outerjoin(
+                ChatEmbedding,
+                and_(
+                    ChatEmbedding.chat_id == Chat.id,
+                    ChatEmbedding.embedder == self.embedder.name,
+                ),
+            )
+            .filter(Chat.user_id == user_id, ChatEmbedding.chat_id.is_(None))
+            .order_by(Chat.created_at)
+        ]
+
+    def _store(self, db: Session, user_id: str, vectors: Dict[str, np.ndarray]) -> None:
+        stored = dict(
+            db.query(ChatEmbedding.chat_id, ChatEmbedding.vector).filter(
+                ChatEmbedding.chat_id.in_(list(vectors)),
+                ChatEmbedding.embedder == self.embedder.name,
+            )
+        )
+        encoded = {
+            chat_id: vector.astype(np.float16).tobytes() for chat_id, vector in vectors.items()
+        }
+        changed = {
+            chat_id: data for chat_id, data in encoded.items() if stored.get(chat_id) != data
+        }
+        if not changed:
+            # Leaves the user's version, and so every local copy, untouched
+            return
+
+        def merge(items: Iterable[Tuple[str, bytes]]) -> None:
+            # Stamped just before commit, so incremental syncs see rows in
+            # about the order they become visible
+            updated_at = datetime.now(timezone.utc)
+            for chat_id, data in items:
+                db.merge(
+                    ChatEmbedding(
+                        chat_id=chat_id,
+                        user_id=user_id,
+                        embedder=self.embedder.name,
+                        vector=data,
+                        updated_at=updated_at,
+                    )
+                )
+            db.commit()
+
+        try:
+            merge(changed.items())
+        except IntegrityError:
+            # Written concurrently by another process, or the chat was deleted
+            db.rollback()
+            for item in changed.items():
+                try:
+                    merge([item])
+                except IntegrityError:
+                    db.rollback()
+
+    async def _embed_chats(self, user_id: str, chat_ids: List[str]) -> None:
+        for start in range(0, len(chat_ids), REBUILD_BATCH_SIZE):
+            batch = chat_ids[start:start + REBUILD_BATCH_SIZE]
+            documents = await run_in_threadpool(_in_session, chat_documents, batch)
+            if not documents:
+                continue
+            embedded = await self.embedder.embed(list(documents.values()))
+            await run_in_threadpool(
+                _in_session, self._store, user_id, dict(zip(documents, embedded))
+            )
+
+    async def ensure(self, user_id: str) -> None:
+        """Embed any of the user's chats that have no embedding yet"""
+        async with self._lock(user_id):
+            missing = await run_in_threadpool(_in_session, self._missing, user_id)
+            if missing:
+                await self._embed_chats(user_id, missing)
+                logger.info(f"Indexed {len(missing)} chats of user {user_id} for related search")
+
+    async def index_chat(self, user_id: str, chat_id: str) -> None:
+        """(Re-)embed one chat"""
+        await self._embed_chats(user_id, [chat_id])
+
+    def index_soon(self, user_id: str, chat_id: str) -> None:
+        """Index a chat in the background"""
+
+        async def run() -> None:
+            try:
+                await self.index_chat(user_id, chat_id)
+            except Exception as e:
+                logger.warning(f"Indexing chat {chat_id} for related search failed: {e}")
+
+        task = asyncio.create_task(run())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _search(
+        self,
+        user_id: str,
+        query: Optional[np.ndarray],
+        limit: int,
+        exclude: Optional[str] = None,
+    ) -> Optional[List[Tuple[str, float]]]:
+        """Top matches for `query`, or for chat `exclude`'s own vector when query is None.
+
+        Returns None if `exclude` has no row yet.
+        """
+        ids, vectors = self._snapshot(user_id)
+        row = ids.index(exclude) if exclude in ids else None
+        if query is None:
+            if row is None:
+                return None
+            query = vectors[row]
+        if not ids:
+            return []
+        # float16 keeps the file small; scoring upcasts so BLAS does the product
+        scores = vectors.astype(np.float32) @ np.asarray(query, dtype=np.float32)
+        if row is not None:
+            scores[row] = -np.inf
+        limit = min(limit, len(ids))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (ids[i], float(scores[i]))
+            for i in top
+            if np.isfinite(scores[i]) and scores[i] >= settings.RELATED_MIN_SCORE
+        ]
+
+    async def related_to_chat(
+        self, user_id: str, chat_id: str, limit: int
+    ) -> List[Tuple[str, float]]:
+        """Chats most similar to `chat_id`, best first, as (chat_id, cosine) pairs"""
+        await self.ensure(user_id)
+        matches = await run_in_threadpool(self._search, user_id, None, limit, chat_id)
+        if matches is None:
+            # Created since it was last checked and not yet indexed
+            await self.index_chat(user_id, chat_id)
+            matches = await run_in_threadpool(self._search, user_id, None, limit, chat_id)
+        return matches or []
+
+    async def related_to_query(
+        self, user_id: str, query: str, limit: int
+    ) -> List[Tuple[str, float]]:
+        """Chats most similar to free text, best first, as (chat_id, cosine) pairs"""
+        await self.ensure(user_id)
+        vector = (await self.embedder.embed([query]))[0]
+        return await run_in_threadpool(self._search, user_id, vector, limit)
+
+    async def close(self) -> None:
+        for task in list(self._pending):
+            task.cancel()
+
+
+related_index = RelatedIndex(
+    Path(settings.RELATED_INDEX_DIR), build_embedder(), settings.RELATED_CACHE_USERS
+)
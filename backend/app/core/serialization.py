@@ -0,0 +1,44 @@
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from app.core.archival import unpack_messages
+from app.models.chat import Chat, ChatArchive, Message
+
+MESSAGE_FIELDS = ("id", "role", "content", "created_at")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    UTC datetimes are written with a trailing "Z", matching what Pydantic
+    emits for response models, so switching encoders does not change payloads.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def chat_transcript(db: Session, chat: Chat, archive: Optional[ChatArchive]) -> Dict[str, Any]:
+    """A ChatRead-shaped dict built from column tuples.
+
+    Messages are selected as plain rows rather than hydrated into ORM objects
+    and revalidated through MessageRead, which dominates the cost of returning
+    long transcripts.
+    """
+    messages: List[Dict[str, Any]] = unpack_messages(archive.payload) if archive else []
+    rows = (
+        db.query(Message.id, Message.role, Message.content, Message.created_at)
+        .filter(Message.chat_id == chat.id)
+        .order_by(Message.created_at)
+    )
+    messages += [dict(zip(MESSAGE_FIELDS, row)) for row in rows]
+    return {
+        "id": chat.id,
+        "name": chat.name,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "messages": messages,
+    }
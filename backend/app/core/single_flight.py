@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def flight_key(query: str, context: Optional[list], levels: Optional[Sequence[str]]) -> str:
+    """Key identifying generations that would produce the same output.
+
+    Text is compared case- and whitespace-insensitively, in the context as
+    well as the query (the context ends with the query itself).
+    """
+    history = [[msg["role"], _normalize(msg["content"])] for msg in context or []]
+    payload = json.dumps(
+        [_normalize(query), history, sorted(levels) if levels else None],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """One in-progress upstream generation and the chunks it has produced so far"""
+
+    def __init__(self, key: str, detached: bool = False) -> None:
+        self.key = key
+        self.detached = detached
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def run(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in source:
+                async with self._changed:
+                    self.chunks.append(chunk)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def replay(self) -> AsyncGenerator[str, None]:
+        """Yield every chunk from the start, then follow the live stream"""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: sent < len(self.chunks) or self.done)
+                pending = self.chunks[sent:]
+                finished = self.done
+            for chunk in pending:
+                yield chunk
+            sent += len(pending)
+            if finished and sent >= len(self.chunks):
+                if isinstance(self.error, asyncio.CancelledError):
+                    # Never end a cancelled generation as if it were complete
+                    raise RuntimeError("generation cancelled")
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """Shares one upstream generation among concurrent identical requests.
+
+    The first caller for a key starts the generation in a background task;
+    callers arriving while it runs attach to it and receive a replay of the
+    chunks emitted so far followed by the live stream. The generation is
+    cancelled if every subscriber goes away before it finishes, unless it
+    was started with ``detached=True``.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def stream(
+        self,
+        key: str,
+        start: Callable[[], AsyncIterator[str]],
+        detached: bool = False,
+    ) -> AsyncGenerator[str, None]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(key, detached)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(flight.run(start()))
+            flight.task.add_done_callback(lambda _: self._forget(flight))
+        else:
+            logger.info(f"Attached to in-progress generation ({len(flight.chunks)} chunks replayed)")
+
+        async for chunk in self._follow(flight):
+            yield chunk
+
+    def attach(self, key: str) -> Optional[AsyncGenerator[str, None]]:
+        """Follow the in-progress generation for `key`, or None if there is none"""
+        flight = self._flights.get(key)
+        if flight is None:
+            return None
+        logger.info(f"Attached to in-progress generation ({len(flight.chunks)} chunks replayed)")
+        return self._follow(flight)
+
+    async def _follow(self, flight: _Flight) -> AsyncGenerator[str, None]:
+        flight.subscribers += 1
+        try:
+            async for chunk in flight.replay():
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and not flight.detached:
+                # Forget it now, so callers arriving before the task has
+                # actually stopped start a fresh generation
+                self._forget(flight)
+                flight.task.cancel()
+
+    def _forget(self, flight: _Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+
+generation_flights = SingleFlight()
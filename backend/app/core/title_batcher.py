@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import re
+from typing import List, Optional, Set, Tuple
+
+from app.config import settings
+from app.core.llm_service import clean_title, llm_service
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9'+#.-]*")
+_STOPWORDS = {
+    "a", "an", "the", "what", "whats", "what's", "is", "are", "can", "could",
+    "you", "me", "please", "explain", "tell", "about", "how", "why", "does",
+    "do", "to", "of", "i", "my", "help", "describe",
+}
+
+
+def heuristic_title(query: str) -> str:
+    """Local fallback title built from the query's leading content words"""
+    words = [w.strip(".'") for w in _WORD_RE.findall(query)]
+    content = [w for w in words if w and w.lower() not in _STOPWORDS]
+    title = " ".join(w if w.isupper() else w.capitalize() for w in (content or words)[:5])
+    return clean_title(title)
+
+
+class TitleBatcher:
+    """Collects title requests over a short window and titles them in one LLM call.
+
+    A request arriving while the batcher is idle is sent at once, since
+    there is nothing to batch it with. Falls back to per-item LLM calls
+    when the batched output can't be parsed, and to a local heuristic when
+    a per-item call fails or the batcher is closed.
+    """
+
+    def __init__(self, window_ms: int, max_batch_size: int) -> None:
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+        # Requests taken off the queue by the worker but not yet dispatched
+        self._collecting: List[Tuple[str, asyncio.Future]] = []
+
+    async def title(self, query: str) -> str:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        return await future
+
+    async def close(self) -> None:
+        """Stop batching; callers still waiting get a heuristic title"""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        pending = list(self._pending)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        waiting = self._collecting
+        self._collecting = []
+        while self._queue is not None and not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        self._fall_back(waiting)
+
+    async def _run(self) -> None:
+        while True:
+            self._collecting = batch = [await self._queue.get()]
+            if self._queue.empty() and not self._pending:
+                # Idle: waiting for the window would only delay this caller
+                deadline = asyncio.get_running_loop().time()
+            else:
+                deadline = asyncio.get_running_loop().time() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._collecting = []
+            # Titles for one batch are generated in the background so the next
+            # window can start collecting immediately
+            task = asyncio.create_task(self._resolve(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _resolve(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        queries = [query for query, _ in batch]
+        titles: Optional[List[str]] = None
+        try:
+            if len(batch) > 1:
+                try:
+                    titles = await llm_service.generate_titles(queries)
+                except Exception as e:
+                    logger.warning(
+                        f"Batched title generation failed for {len(batch)} queries, "
+                        f"falling back to per-item calls: {str(e)}"
+                    )
+            if titles is None:
+                titles = await asyncio.gather(*(self._title_one(query) for query in queries))
+        except asyncio.CancelledError:
+            self._fall_back(batch)
+            raise
+
+        for (_, future), title in zip(batch, titles):
+            if not future.done():
+                future.set_result(title)
+
+    @staticmethod
+    def _fall_back(batch: List[Tuple[str, asyncio.Future]]) -> None:
+        for query, future in batch:
+            if not future.done():
+                future.set_result(heuristic_title(query))
+
+    async def _title_one(self, query: str) -> str:
+        try:
+            return await llm_service.generate_title(query)
+        except Exception as e:
+            logger.error(f"Error generating title: {str(e)}")
+            return heuristic_title(query)
+
+
+title_batcher = TitleBatcher(
+    window_ms=settings.TITLE_BATCH_WINDOW_MS,
+    max_batch_size=settings.TITLE_BATCH_MAX_SIZE,
+)
@@ -1,22 +1,161 @@
-from sqlalchemy import create_engine
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.config import settings
 
-# Create SQLAlchemy engine
-engine = create_engine(str(settings.DATABASE_URL))
+# Create SessionLocal class for database sessions; it is bound to the engine
+# the first time get_engine() runs (normally during application startup)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
-# Create SessionLocal class for database sessions
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
 
 # Create Base class for SQLAlchemy models
 Base = declarative_base()
 
+
+@lru_cache()
+def get_engine() -> Engine:
+    """Create the SQLAlchemy engine on first use and bind SessionLocal to it"""
+    engine = create_engine(
+        str(settings.DATABASE_URL),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+    )
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
+def warm_pool(engine: Engine, connections: int) -> None:
+    """Open `connections` pooled connections up front so first requests skip the handshake"""
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        # Returning them to the pool keeps them open for reuse
+        for conn in opened:
+            conn.close()
+
+
+class ReplicaRouter:
+    """Routes read-only sessions to healthy replicas.
+
+    Callers ask for the primary when a read must see the client's own
+    recent writes (see app.core.read_your_writes). A replica that fails to
+    connect is skipped for REPLICA_RETRY_SECONDS.
+    """
+
+    def __init__(self, urls: List[str], retry_seconds: float) -> None:
+        self.urls = urls
+        self.retry_seconds = retry_seconds
+        self._engines: Optional[List[Engine]] = None
+        self._down_until: Dict[Engine, float] = {}
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def engines(self) -> List[Engine]:
+        with self._lock:
+            if self._engines is None:
+                self._engines = [self._create_engine(url) for url in self.urls]
+            return self._engines
+
+    def _create_engine(self, url: str) -> Engine:
+        engine = create_engine(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+
+        @event.listens_for(engine, "handle_error")
+        def _on_error(context) -> None:
+            if context.is_disconnect:
+                self.mark_down(engine)
+
+        return engine
+
+    def mark_down(self, engine: Engine) -> None:
+        logger.warning(f"Read replica {engine.url.host} unavailable, using primary")
+        self._down_until[engine] = time.monotonic() + self.retry_seconds
+
+    def _healthy_replicas(self) -> List[Engine]:
+        engines = self.engines
+        if not engines:
+            return []
+        now = time.monotonic()
+        start = next(self._round_robin) % len(engines)
+        ordered = engines[start:] + engines[:start]
+        return [engine for engine in ordered if self._down_until.get(engine, 0) <= now]
+
+    def session_for(self, primary: bool = False) -> Session:
+        """Open a read session on a replica, or on the primary if asked or none is usable"""
+        if self.urls and not primary:
+            for engine in self._healthy_replicas():
+                db = SessionLocal(bind=engine, info={"replica": True})
+                try:
+                    # Check out the connection now so a dead replica fails over here
+                    db.connection()
+                    return db
+                except OperationalError:
+                    db.close()
+                    self.mark_down(engine)
+        return SessionLocal()
+
+    def dispose(self) -> None:
+        if self._engines:
+            for engine in self._engines:
+                engine.dispose()
+
+
+replica_router = ReplicaRouter(
+    urls=settings.DATABASE_REPLICA_URLS,
+    retry_seconds=settings.REPLICA_RETRY_SECONDS,
+)
+
+
+class RequestWrites:
+    """Whether the request being handled has committed a write to the primary"""
+
+    def __init__(self) -> None:
+        self.wrote = False
+
+
+# Set for each request by ReadYourWritesMiddleware
+request_writes: ContextVar[Optional[RequestWrites]] = ContextVar("request_writes", default=None)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _record_write(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _note_request_write(session: Session) -> None:
+    # Any session committing while a request is handled counts, auth included
+    writes = request_writes.get()
+    if session.info.pop("wrote", False) and writes is not None and not session.info.get("replica"):
+        writes.wrote = True
+
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
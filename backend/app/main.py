@@ -1,17 +1,33 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
 
-from app.api.v1 import auth, users, chats
+from app.api.v1 import auth, users, chats, jobs, profiles
 from app.config import settings
+from app.core.compression import CompressionMiddleware
+from app.core.lifecycle import lifespan, startup_state
+from app.core.profiling import ProfilingMiddleware
+from app.core.read_your_writes import READ_PRIMARY_HEADER, ReadYourWritesMiddleware
+from app.core.serialization import ORJSONResponse
 
 # Use Uvicorn's built-in logging configuration
 logger = logging.getLogger(__name__)
 
+# Import cost of the app module graph (heavy provider SDKs are deferred to
+# the lifespan, which reports its own phases)
+startup_state.timings_ms["import"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+
 # Create FastAPI app
 app = FastAPI(
-    title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    title=settings.PROJECT_NAME,
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -21,12 +37,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[READ_PRIMARY_HEADER],
 )
 
+# After a write, keep the client's reads on the primary for a while
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Compress non-streaming JSON responses
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+
+# On-demand / sampled request profiling (outermost, so it sees the whole request)
+app.add_middleware(ProfilingMiddleware)
+
 # Include API routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
 app.include_router(chats.router, prefix=f"{settings.API_V1_STR}/chats", tags=["chats"])
+app.include_router(jobs.router, prefix=f"{settings.API_V1_STR}/jobs", tags=["jobs"])
+app.include_router(profiles.router, prefix=f"{settings.API_V1_STR}/profiles", tags=["profiles"])
 
 
 @app.get("/")
@@ -41,6 +69,15 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint: OK only once startup warm-up has completed"""
+    report = startup_state.report()
+    if not startup_state.ready:
+        return JSONResponse(status_code=503, content={"status": "unavailable", **report})
+    return {"status": "ready", **report}
+
+
 # Exception handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -0,0 +1,54 @@
+import uuid
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, JSON, Index
+from sqlalchemy.sql import func, text
+from sqlalchemy.orm import relationship
+
+from app.database import Base
+
+
+class BatchJob(Base):
+    """A bulk request to explain many topics, processed by the batch workers"""
+
+    __tablename__ = "batch_jobs"
+    id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, cancelled
+    explanation_levels = Column(JSON, nullable=True)
+    total = Column(Integer, nullable=False)
+    completed_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    items = relationship(
+        "BatchJobItem",
+        back_populates="job",
+        cascade="all, delete-orphan",
+        order_by="BatchJobItem.position",
+    )
+
+
+class BatchJobItem(Base):
+    """One topic of a batch job; becomes a chat once explained"""
+
+    __tablename__ = "batch_job_items"
+    __table_args__ = (
+        # Workers claim the oldest due pending item
+        Index(
+            "ix_batch_job_items_pending",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_id = Column(String, ForeignKey("batch_jobs.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    topic = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed, cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    # Earliest time a pending item may be (re)tried
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    chat_id = Column(String, ForeignKey("chats.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
+    job = relationship("BatchJob", back_populates="items")
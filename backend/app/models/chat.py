@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, JSON, LargeBinary, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -10,6 +10,7 @@ class Chat(Base):
     id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     name = Column(String, nullable=True)
+    explanation_levels = Column(JSON, nullable=True)  # overrides the user's default
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True),
@@ -23,6 +24,12 @@ class Chat(Base):
         cascade="all, delete-orphan",
         order_by="Message.created_at",
     )
+    archive = relationship(
+        "ChatArchive",
+        back_populates="chat",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
 
 
 class Message(Base):
@@ -33,3 +40,19 @@ class Message(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     chat = relationship("Chat", back_populates="messages")
+
+    __table_args__ = (
+        # A chat's messages in order, as read by transcripts and the export's keyset pages
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    )
+
+
+class ChatArchive(Base):
+    """Messages of an idle chat, moved out of the hot table as one compressed row"""
+
+    __tablename__ = "chat_archives"
+    chat_id = Column(String, ForeignKey("chats.id"), primary_key=True)
+    payload = Column(LargeBinary, nullable=False)  # zstd-compressed JSON message list
+    message_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    chat = relationship("Chat", back_populates="archive")
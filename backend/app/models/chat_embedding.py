@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class ChatEmbedding(Base):
+    """Embedding a chat is found by in related search (source of truth for the local index)"""
+
+    __tablename__ = "chat_embeddings"
+    chat_id = Column(String, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    embedder = Column(String, nullable=False)  # name of the embedder that produced it
+    vector = Column(LargeBinary, nullable=False)  # float16 row, native byte order
+    updated_at = Column(
+        DateTime(timezone=True),
+        onupdate=func.now(),
+        server_default=func.now(),
+    )
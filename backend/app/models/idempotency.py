@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class IdempotencyKey(Base):
+    """Outcome of a request sent with an Idempotency-Key header"""
+
+    __tablename__ = "idempotency_keys"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="in_progress")  # in_progress, completed, failed
+    chat_id = Column(String, nullable=True)
+    message_id = Column(String, nullable=True)  # user message saved by the request
+    response_message_id = Column(String, nullable=True)  # assistant reply, once saved
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
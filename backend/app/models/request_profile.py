@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Text, DateTime, JSON
+
+from app.database import Base
+
+
+class StoredProfile(Base):
+    """A finished request profile, shared by every worker for retrieval"""
+
+    __tablename__ = "request_profiles"
+    id = Column(String, primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    summary = Column(JSON, nullable=False)  # phases, SQL totals, sample count
+    folded = Column(Text, nullable=False)  # stack samples as folded stacks
@@ -0,0 +1,43 @@
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, List, Optional
+from datetime import datetime
+
+from app.schemas.chat import ExplanationLevel
+
+Topic = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=2000)]
+
+
+class BatchJobCreate(BaseModel):
+    topics: List[Topic] = Field(..., min_length=1)
+    # Explanation sections for every topic; falls back to the user's default
+    levels: Optional[List[ExplanationLevel]] = Field(None, min_length=1)
+
+
+class BatchJobItemRead(BaseModel):
+    position: int
+    topic: str
+    status: str
+    attempts: int
+    chat_id: Optional[str]
+    error: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+
+class BatchJobRead(BaseModel):
+    id: str
+    status: str
+    total: int
+    completed_count: int
+    failed_count: int
+    explanation_levels: Optional[List[ExplanationLevel]]
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class BatchJobDetail(BatchJobRead):
+    items: List[BatchJobItemRead] = []
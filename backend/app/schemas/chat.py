@@ -1,11 +1,16 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
+# Keys of app.core.prompts.EXPLANATION_SECTIONS
+ExplanationLevel = Literal["eli5", "high_school", "college", "analogy"]
+
 
 class MessageCreate(BaseModel):
     content: str = Field(..., min_length=1)
     role: str = Field(..., pattern="^(user|assistant)$")
+    # Explanation sections to generate; falls back to the chat's, then the user's default
+    levels: Optional[List[ExplanationLevel]] = Field(None, min_length=1)
 
 
 class MessageRead(BaseModel):
@@ -20,6 +25,8 @@ class MessageRead(BaseModel):
 
 class ChatCreate(BaseModel):
     initial_query: str = Field(..., min_length=1)
+    # Default explanation sections for messages in this chat
+    levels: Optional[List[ExplanationLevel]] = Field(None, min_length=1)
 
 
 class ChatRead(BaseModel):
@@ -31,3 +38,11 @@ class ChatRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class RelatedChat(BaseModel):
+    id: str
+    name: Optional[str]
+    updated_at: Optional[datetime]
+    # Cosine similarity to the chat or query searched for
+    score: float
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
+from app.schemas.chat import ExplanationLevel
+
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -20,6 +22,7 @@ class UserInDB(UserBase):
     is_active: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
+    explanation_levels: Optional[List[ExplanationLevel]] = None
 
     class Config:
         from_attributes = True
@@ -29,6 +32,11 @@ class User(UserInDB):
     pass
 
 
+class UserPreferences(BaseModel):
+    # None restores the default of all explanation sections
+    explanation_levels: Optional[List[ExplanationLevel]] = Field(None, min_length=1)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
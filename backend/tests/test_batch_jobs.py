@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+from app.core import batch_jobs
+from app.core.batch_jobs import BatchRunner, claim_next_item
+from app.core.llm_service import llm_service
+from app.core.related_index import related_index
+from app.database import SessionLocal
+
+from tests.conftest import signup
+
+
+def test_item_makes_one_provider_call_and_streams_its_result(api, monkeypatch):
+    headers = signup(api)
+    job = api.post(
+        "/api/v1/jobs/", json={"topics": ["What is photosynthesis?"]}, headers=headers
+    ).json()
+    calls = []
+
+    async def generate_explanation(query, context=None, levels=None):
+        calls.append(query)
+        return "Plants make food from light."
+
+    async def generate_title(query):
+        raise AssertionError("batch items must not make a title call")
+
+    monkeypatch.setattr(llm_service, "generate_explanation", generate_explanation)
+    monkeypatch.setattr(llm_service, "generate_title", generate_title)
+    monkeypatch.setattr(related_index, "index_soon", lambda user_id, chat_id: None)
+    db = SessionLocal()
+    claimed = claim_next_item(db)
+    db.close()
+
+    asyncio.run(BatchRunner(1, 60)._process(claimed))
+    response = api.get(f"/api/v1/jobs/{job['id']}/results", headers=headers)
+
+    assert calls == ["What is photosynthesis?"]
+    result, complete = [json.loads(line) for line in response.text.splitlines()]
+    assert result["status"] == "completed"
+    assert result["content"] == "Plants make food from light."
+    assert complete == {"type": "complete", "status": "completed", "completed": 1, "failed": 0}
+    chat = api.get(f"/api/v1/chats/{result['chat_id']}", headers=headers).json()
+    assert chat["name"] == batch_jobs.heuristic_title("What is photosynthesis?")
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from typing import List, Optional
+
+import pytest
+
+from app.core.hedging import Hedger, first_chunk
+
+
+class FakeStream:
+    """Provider stream whose first chunk arrives after `delay` (or fails with `error`)"""
+
+    def __init__(self, name: str, delay: float, error: Optional[Exception] = None) -> None:
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self) -> "FakeStream":
+        return self
+
+    async def __anext__(self) -> str:
+        if self.sent == 0:
+            await asyncio.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+        if self.sent == 2:
+            raise StopAsyncIteration
+        self.sent += 1
+        return f"{self.name}-{self.sent}"
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class FakeProvider:
+    """Factory of FakeStreams, remembering every stream it started"""
+
+    def __init__(self, name: str, delay: float, error: Optional[Exception] = None) -> None:
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.started: List[FakeStream] = []
+
+    def __call__(self) -> FakeStream:
+        self.started.append(FakeStream(self.name, self.delay, self.error))
+        return self.started[-1]
+
+
+def race(primary, hedge, hedge_after=0.05, timeout=2.0, may_hedge=lambda: True):
+    return asyncio.run(first_chunk(primary, hedge, hedge_after, timeout, may_hedge))
+
+
+def test_hedge_wins_and_primary_is_closed():
+    primary, hedge = FakeProvider("primary", 1.0), FakeProvider("hedge", 0.01)
+
+    stream, chunk, hedge_won = race(primary, hedge)
+
+    assert (chunk, hedge_won) == ("hedge-1", True)
+    assert stream is hedge.started[0]
+    assert primary.started[0].closed
+    assert not hedge.started[0].closed
+
+
+def test_fast_primary_never_starts_a_hedge():
+    primary, hedge = FakeProvider("primary", 0.01), FakeProvider("hedge", 0.01)
+
+    stream, chunk, hedge_won = race(primary, hedge, hedge_after=0.5)
+
+    assert (chunk, hedge_won) == ("primary-1", False)
+    assert hedge.started == []
+
+
+def test_denied_budget_waits_for_the_primary():
+    hedger = Hedger(percentile=95, initial_delay=0.05, min_delay=0.01, max_rate=0.0)
+    primary, hedge = FakeProvider("primary", 0.2), FakeProvider("hedge", 0.01)
+
+    stream, chunk = asyncio.run(hedger.first_chunk(primary, hedge, timeout=2.0))
+
+    assert chunk == "primary-1"
+    assert hedge.started == []
+    assert hedger.metrics.budget_denied == 1
+    assert hedger.metrics.hedged == 0
+
+
+def test_budget_allows_a_hedge_once_earned():
+    hedger = Hedger(percentile=95, initial_delay=0.05, min_delay=0.01, max_rate=1.0)
+    primary, hedge = FakeProvider("primary", 1.0), FakeProvider("hedge", 0.01)
+
+    stream, chunk = asyncio.run(hedger.first_chunk(primary, hedge, timeout=2.0))
+
+    assert chunk == "hedge-1"
+    assert (hedger.metrics.hedged, hedger.metrics.hedge_wins) == (1, 1)
+
+
+def test_fast_primary_failure_retries_with_the_hedge_at_once():
+    primary = FakeProvider("primary", 0.0, RuntimeError("UNAVAILABLE"))
+    hedge = FakeProvider("hedge", 0.01)
+    started = time.perf_counter()
+
+    stream, chunk, hedge_won = race(primary, hedge, hedge_after=1.0)
+
+    assert (chunk, hedge_won) == ("hedge-1", True)
+    # Did not wait out the hedge delay
+    assert time.perf_counter() - started < 0.5
+
+
+def test_both_failing_raises_the_first_error():
+    primary = FakeProvider("primary", 0.0, RuntimeError("primary down"))
+    hedge = FakeProvider("hedge", 0.0, RuntimeError("hedge down"))
+
+    with pytest.raises(RuntimeError, match="primary down"):
+        race(primary, hedge)
+
+
+def test_overall_timeout_closes_every_stream():
+    hedger = Hedger(percentile=95, initial_delay=0.02, min_delay=0.01, max_rate=1.0)
+    primary, hedge = FakeProvider("primary", 5.0), FakeProvider("hedge", 5.0)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(hedger.first_chunk(primary, hedge, timeout=0.1))
+
+    assert [s.closed for s in primary.started + hedge.started] == [True, True]
+    assert hedger.metrics.first_token_timeouts == 1
+
+
+def test_empty_stream_is_an_answer():
+    primary = FakeProvider("primary", 0.0, StopAsyncIteration())
+
+    with pytest.raises(StopAsyncIteration):
+        race(primary, None)
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from starlette.requests import Request
+
+from app.core.http_cache import build_etag, is_not_modified
+
+LAST_MODIFIED = datetime(2026, 10, 19, 12, 0, 0, 250000, tzinfo=timezone.utc)
+ETAG = build_etag("chat", LAST_MODIFIED)
+
+
+def request(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()],
+        }
+    )
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value, usegmt=True)
+
+
+def test_write_later_in_the_same_second_is_modified():
+    # The client's copy is from 12:00:00.1; the chat changed at 12:00:00.25
+    since = http_date(LAST_MODIFIED.replace(microsecond=100000))
+
+    assert not is_not_modified(request(if_modified_since=since), ETAG, LAST_MODIFIED)
+
+
+def test_copy_from_a_later_second_is_not_modified():
+    since = http_date(LAST_MODIFIED + timedelta(seconds=1))
+
+    assert is_not_modified(request(if_modified_since=since), ETAG, LAST_MODIFIED)
+
+
+def test_older_copy_is_modified():
+    since = http_date(LAST_MODIFIED - timedelta(seconds=1))
+
+    assert not is_not_modified(request(if_modified_since=since), ETAG, LAST_MODIFIED)
+
+
+def test_matching_etag_wins_over_if_modified_since():
+    since = http_date(LAST_MODIFIED - timedelta(seconds=1))
+
+    assert is_not_modified(
+        request(if_none_match=ETAG, if_modified_since=since), ETAG, LAST_MODIFIED
+    )
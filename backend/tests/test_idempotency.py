@@ -0,0 +1,66 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.api.v1 import chats
+from app.core.idempotency import request_fingerprint
+from app.database import SessionLocal
+from app.models.chat import Message
+from app.models.idempotency import IdempotencyKey
+from app.schemas.chat import MessageCreate
+
+from tests.conftest import signup
+
+MESSAGE = {"content": "Explain black holes", "role": "user"}
+
+
+def create_chat(api, headers) -> str:
+    response = api.post("/api/v1/chats/", json={"initial_query": "hello"}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def events(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_retry_after_failure_before_save_starts_over(api, monkeypatch):
+    headers = {**signup(api), "Idempotency-Key": "k1"}
+    chat_id = create_chat(api, headers={"Authorization": headers["Authorization"]})
+    restore_chat = chats.restore_chat
+
+    def fail_once(db, chat_id):
+        monkeypatch.setattr(chats, "restore_chat", restore_chat)
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(chats, "restore_chat", fail_once)
+
+    first = api.post(f"/api/v1/chats/{chat_id}/messages", json=MESSAGE, headers=headers)
+    retry = api.post(f"/api/v1/chats/{chat_id}/messages", json=MESSAGE, headers=headers)
+
+    assert first.status_code == 500
+    assert retry.status_code == 200
+    assert [event["type"] for event in events(retry)][-1] == "complete"
+
+
+def test_abandoned_key_without_message_is_taken_over(api):
+    headers = {**signup(api), "Idempotency-Key": "k2"}
+    chat_id = create_chat(api, headers={"Authorization": headers["Authorization"]})
+    me = api.get("/api/v1/users/me", headers=headers).json()
+    db = SessionLocal()
+    db.add(
+        IdempotencyKey(
+            user_id=me["id"],
+            key="k2",
+            request_hash=request_fingerprint(
+                "add_message", chat_id, MessageCreate(**MESSAGE).model_dump_json()
+            ),
+            created_at=datetime.now(timezone.utc) - timedelta(hours=1),
+        )
+    )
+    db.commit()
+
+    response = api.post(f"/api/v1/chats/{chat_id}/messages", json=MESSAGE, headers=headers)
+
+    assert response.status_code == 200
+    assert db.query(Message).filter_by(chat_id=chat_id, role="user").count() == 2
+    db.close()
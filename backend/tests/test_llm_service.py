@@ -0,0 +1,179 @@
+import asyncio
+import statistics
+import time
+from typing import List
+
+import grpc
+import pytest
+from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+    GenerativeServiceGrpcAsyncIOTransport,
+)
+from google.ai.generativelanguage_v1beta.types import content, generative_service
+
+from app.config import settings
+from app.core.llm_service import LLMService
+
+SERVICE = "google.ai.generativelanguage.v1beta.GenerativeService"
+
+
+class StubGenerativeService:
+    """Local Gemini GenerativeService streaming a fixed reply.
+
+    Records the peer (client address and port) of every call, which
+    identifies the TCP connection it arrived on.
+    """
+
+    def __init__(self) -> None:
+        self.peers: List[str] = []
+        self.first_token_delay = 0.0
+
+    async def stream_generate_content(self, request, context):
+        self.peers.append(context.peer())
+        await asyncio.sleep(self.first_token_delay)
+        for word in ("hello ", "world"):
+            yield generative_service.GenerateContentResponse(
+                candidates=[
+                    generative_service.Candidate(
+                        content=content.Content(role="model", parts=[content.Part(text=word)])
+                    )
+                ]
+            )
+
+    async def count_tokens(self, request, context):
+        self.peers.append(context.peer())
+        return generative_service.CountTokensResponse(total_tokens=1)
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        return grpc.method_handlers_generic_handler(
+            SERVICE,
+            {
+                "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+                    self.stream_generate_content,
+                    request_deserializer=generative_service.GenerateContentRequest.deserialize,
+                    response_serializer=generative_service.GenerateContentResponse.serialize,
+                ),
+                "CountTokens": grpc.unary_unary_rpc_method_handler(
+                    self.count_tokens,
+                    request_deserializer=generative_service.CountTokensRequest.deserialize,
+                    response_serializer=generative_service.CountTokensResponse.serialize,
+                ),
+            },
+        )
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Point the provider channel at a local stub server, started inside each test's loop"""
+    service = StubGenerativeService()
+    channels = []
+
+    def create_channel(host, options=None, **kwargs):
+        channels.append(options)
+        return grpc.aio.insecure_channel(f"127.0.0.1:{service.port}", options=options)
+
+    async def start() -> grpc.aio.Server:
+        server = grpc.aio.server()
+        server.add_generic_rpc_handlers([service.handler()])
+        service.port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        return server
+
+    monkeypatch.setattr(
+        GenerativeServiceGrpcAsyncIOTransport, "create_channel", staticmethod(create_channel)
+    )
+    service.start = start
+    service.channels = channels
+    return service
+
+
+async def timed_reply(service: LLMService, query: str) -> tuple:
+    """(reply, seconds to first chunk)"""
+    started = time.perf_counter()
+    first_token = None
+    reply = ""
+    async for chunk in service.generate_response_stream(query):
+        if first_token is None:
+            first_token = time.perf_counter() - started
+        reply += chunk
+    return reply, first_token
+
+
+def test_requests_reuse_one_connection(stub):
+    service = LLMService()
+
+    async def run() -> list:
+        server = await stub.start()
+        try:
+            # Full and fast model tiers alternate over the same channel
+            return [
+                await timed_reply(service, query)
+                for query in ["Explain black holes", "hi"] * 5
+            ]
+        finally:
+            await server.stop(None)
+
+    replies = asyncio.run(run())
+
+    assert {reply for reply, _ in replies} == {"hello world"}
+    assert len(stub.channels) == 1
+    assert ("grpc.keepalive_permit_without_calls", 1) in stub.channels[0]
+    assert len(stub.peers) == 10
+    assert len(set(stub.peers)) == 1
+    # Only the first request pays for connecting
+    first, later = replies[0][1], [ttft for _, ttft in replies[1:]]
+    assert statistics.median(later) < first
+
+
+def test_warm_up_connects_before_the_first_request(stub, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_WARMUP", True)
+    service = LLMService()
+
+    async def run() -> list:
+        server = await stub.start()
+        try:
+            await service.warm_up()
+            return [await timed_reply(service, "Explain black holes") for _ in range(2)]
+        finally:
+            await server.stop(None)
+
+    asyncio.run(run())
+
+    assert len(set(stub.peers)) == 1
+    assert len(stub.peers) == 3
+
+
+def test_first_token_timeout_raises_and_keeps_the_connection(stub, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_FIRST_TOKEN_TIMEOUT_SECONDS", 0.2)
+    service = LLMService()
+
+    async def run() -> str:
+        server = await stub.start()
+        try:
+            stub.first_token_delay = 2.0
+            with pytest.raises(asyncio.TimeoutError):
+                await timed_reply(service, "Explain black holes")
+            stub.first_token_delay = 0.0
+            reply, _ = await timed_reply(service, "Explain black holes")
+            return reply
+        finally:
+            await server.stop(None)
+
+    assert asyncio.run(run()) == "hello world"
+    assert service.metrics()["first_token"]["full"]["first_token_timeouts"] == 1
+    assert len(set(stub.peers)) == 1
+
+
+def test_unreachable_provider_fails_within_connect_timeout(stub, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CONNECT_TIMEOUT_SECONDS", 0.2)
+    service = LLMService()
+
+    async def run() -> float:
+        server = await stub.start()
+        await server.stop(None)
+        started = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await timed_reply(service, "Explain black holes")
+        return time.perf_counter() - started
+
+    # Well before the 20s first-token budget would have run out
+    assert asyncio.run(run()) < 2
@@ -0,0 +1,61 @@
+import pytest
+
+from app.config import settings
+from app.core.profiling import ProfileStore, RequestProfile, profile_store
+from app.database import SessionLocal
+from app.models.request_profile import StoredProfile
+
+from tests.conftest import signup
+
+TOKEN = "profiling-secret"
+
+
+@pytest.fixture
+def admin(monkeypatch) -> dict:
+    monkeypatch.setattr(settings, "PROFILING_ADMIN_TOKEN", TOKEN)
+    return {"X-Profile": TOKEN}
+
+
+def test_one_header_profiles_and_reads_profiles(api, admin):
+    headers = signup(api)
+
+    profiled = api.get("/api/v1/chats/", headers={**headers, **admin})
+    profile_id = profiled.headers["X-Profile-Id"]
+    listed = api.get("/api/v1/profiles/", headers=admin)
+    fetched = api.get(f"/api/v1/profiles/{profile_id}", headers=admin)
+    folded = api.get(f"/api/v1/profiles/{profile_id}", params={"format": "folded"}, headers=admin)
+
+    assert [profile["id"] for profile in listed.json()] == [profile_id]
+    assert "X-Profile-Id" not in listed.headers
+    assert fetched.json()["path"] == "/api/v1/chats/"
+    assert fetched.json()["status_code"] == 200
+    assert folded.status_code == 200
+    assert api.get(f"/api/v1/profiles/{profile_id}").status_code == 403
+    assert api.get("/api/v1/profiles/missing", headers=admin).status_code == 404
+
+
+def test_profiles_are_shared_through_the_database(api, admin):
+    """A profile saved by one worker's store is served by another's"""
+    profile = RequestProfile("GET", "/api/v1/chats/")
+    ProfileStore(settings.PROFILING_MAX_STORED).add(profile)
+
+    fetched = api.get(f"/api/v1/profiles/{profile.id}", headers=admin)
+
+    assert fetched.status_code == 200
+    assert fetched.json()["id"] == profile.id
+
+
+def test_store_keeps_only_the_newest_profiles(database, monkeypatch):
+    monkeypatch.setattr(profile_store, "max_size", 2)
+    profiles = [RequestProfile("GET", f"/{i}") for i in range(4)]
+    for i, profile in enumerate(profiles):
+        profile.created_at += i
+        profile_store.add(profile)
+
+    db = SessionLocal()
+    kept = [stored.id for stored in profile_store.list(db)]
+    stored_count = db.query(StoredProfile).count()
+    db.close()
+
+    assert kept == [profiles[3].id, profiles[2].id]
+    assert stored_count == 2
@@ -0,0 +1,186 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.core import related_index as related
+from app.core.related_index import HashingEmbedder, RelatedIndex
+from app.database import SessionLocal
+from app.models.chat import Chat, Message
+from app.models.user import User
+
+from tests.conftest import signup
+
+TOPICS = {
+    "holes": ("Black Holes", "Explain black holes", "A black hole is where gravity traps light."),
+    "stars": (
+        "Neutron Stars",
+        "Explain neutron stars",
+        "A neutron star that grows too heavy becomes a black hole.",
+    ),
+    "bread": ("Baking Bread", "How do I bake bread", "Knead the dough and let the yeast rise."),
+}
+
+
+def embed(embedder: HashingEmbedder, *texts: str) -> np.ndarray:
+    return asyncio.run(embedder.embed(list(texts)))
+
+
+def add_chat(db, user_id: str, topic: str) -> str:
+    name, query, answer = TOPICS[topic]
+    chat = Chat(user_id=user_id, name=name)
+    db.add(chat)
+    db.flush()
+    asked_at = datetime.now(timezone.utc)
+    db.add_all(
+        [
+            Message(chat_id=chat.id, role="user", content=query, created_at=asked_at),
+            Message(
+                chat_id=chat.id,
+                role="assistant",
+                content=answer,
+                created_at=asked_at + timedelta(microseconds=1),
+            ),
+        ]
+    )
+    db.commit()
+    return chat.id
+
+
+@pytest.fixture
+def index(database, tmp_path) -> RelatedIndex:
+    return RelatedIndex(tmp_path / "related", HashingEmbedder(64))
+
+
+@pytest.fixture
+def chats(database) -> dict:
+    """One user's chats on three topics, by topic"""
+    db = SessionLocal()
+    user = User(email="reader@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    ids = {topic: add_chat(db, user.id, topic) for topic in TOPICS}
+    ids["user"] = user.id
+    db.close()
+    return ids
+
+
+def local_meta(index: RelatedIndex, user_id: str) -> dict:
+    return json.loads((index._dir(user_id) / "index.json").read_text())
+
+
+def test_hashing_embedder_is_deterministic_and_unit_length():
+    vectors = embed(HashingEmbedder(64), "black holes", "black holes", "baking bread")
+
+    assert np.array_equal(vectors[0], vectors[1])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_query_returns_top_k_best_first(index, chats):
+    matches = asyncio.run(index.related_to_query(chats["user"], "black hole gravity", 2))
+
+    assert len(matches) <= 2
+    assert matches[0][0] == chats["holes"]
+    assert [score for _, score in matches] == sorted((s for _, s in matches), reverse=True)
+
+
+def test_related_to_chat_excludes_the_chat_itself(index, chats):
+    matches = asyncio.run(index.related_to_chat(chats["user"], chats["holes"], 5))
+
+    assert chats["holes"] not in [chat_id for chat_id, _ in matches]
+    assert matches[0][0] == chats["stars"]
+
+
+def test_local_copy_is_updated_in_place(index, chats):
+    user_id = chats["user"]
+    asyncio.run(index.related_to_query(user_id, "bread", 5))
+    before = local_meta(index, user_id)
+
+    db = SessionLocal()
+    new_chat = add_chat(db, user_id, "holes")
+    db.add(Message(chat_id=chats["bread"], role="assistant", content="Sourdough uses a starter."))
+    db.commit()
+    db.close()
+    asyncio.run(index.index_chat(user_id, new_chat))
+    asyncio.run(index.index_chat(user_id, chats["bread"]))
+    matches = dict(asyncio.run(index.related_to_query(user_id, "sourdough starter", 5)))
+    after = local_meta(index, user_id)
+
+    assert after["vectors"] == before["vectors"]
+    assert after["ids"] == before["ids"] + [new_chat]
+    assert max(matches, key=matches.get) == chats["bread"]
+
+
+def test_unchanged_document_does_not_change_version(index, chats):
+    user_id = chats["user"]
+    asyncio.run(index.ensure(user_id))
+    db = SessionLocal()
+    version = index._version(db, user_id)
+
+    asyncio.run(index.index_chat(user_id, chats["holes"]))
+
+    assert index._version(db, user_id) == version
+    db.close()
+
+
+def test_deleted_chat_rebuilds_local_copy(index, chats):
+    user_id = chats["user"]
+    asyncio.run(index.related_to_query(user_id, "bread", 5))
+    before = local_meta(index, user_id)
+
+    db = SessionLocal()
+    db.query(related.ChatEmbedding).filter_by(chat_id=chats["bread"]).delete()
+    db.commit()
+    db.close()
+    ids, _ = index._snapshot(user_id)
+
+    assert chats["bread"] not in ids
+    assert local_meta(index, user_id)["vectors"] != before["vectors"]
+
+
+def test_document_reads_only_the_first_messages(database, chats):
+    db = SessionLocal()
+    for i in range(related.DOCUMENT_MESSAGES):
+        db.add(
+            Message(
+                chat_id=chats["stars"],
+                role="assistant",
+                content=f"later answer {i}",
+                created_at=datetime.now(timezone.utc) + timedelta(seconds=i + 1),
+            )
+        )
+    db.commit()
+
+    document = related.chat_documents(db, [chats["stars"]])[chats["stars"]]
+
+    assert "Explain neutron stars" in document
+    assert f"later answer {related.DOCUMENT_MESSAGES - 1}" not in document
+    assert not related.changes_document(db, chats["stars"])
+    assert related.changes_document(db, chats["holes"])
+    db.close()
+
+
+def test_related_endpoints(api):
+    headers = signup(api)
+    ids = {}
+    for topic in ("holes", "stars", "bread"):
+        response = api.post(
+            "/api/v1/chats/", json={"initial_query": TOPICS[topic][1]}, headers=headers
+        )
+        ids[topic] = response.json()["id"]
+
+    by_query = api.get(
+        "/api/v1/chats/related", params={"q": "black holes", "limit": 1}, headers=headers
+    )
+    by_chat = api.get(f"/api/v1/chats/{ids['holes']}/related", headers=headers)
+    missing = api.get("/api/v1/chats/not-a-chat/related", headers=headers)
+
+    assert by_query.status_code == 200
+    assert [chat["id"] for chat in by_query.json()] == [ids["holes"]]
+    assert by_chat.status_code == 200
+    assert ids["holes"] not in [chat["id"] for chat in by_chat.json()]
+    assert by_chat.json()[0]["id"] == ids["stars"]
+    assert missing.status_code == 404
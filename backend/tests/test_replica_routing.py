@@ -0,0 +1,114 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.config import settings
+from app.core.read_your_writes import READ_PRIMARY_COOKIE, READ_PRIMARY_HEADER
+from app.database import Base, get_engine, replica_router
+from app.models import batch_job, chat, chat_embedding, idempotency, user  # noqa: F401
+
+CREDENTIALS = {"email": "reader@example.com", "password": "secret123"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """The app on two local databases: a primary and a replica that never catches up"""
+    primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    for url in (primary_url, replica_url):
+        engine = create_engine(url)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+
+    monkeypatch.setattr(settings, "DATABASE_URL", primary_url)
+    monkeypatch.setattr(replica_router, "urls", [replica_url])
+    monkeypatch.setattr(replica_router, "_engines", None)
+    monkeypatch.setattr(replica_router, "_down_until", {})
+    get_engine.cache_clear()
+
+    from app.main import app
+
+    # https, so the Secure marker cookie is sent back
+    with TestClient(app, base_url="https://testserver") as client:
+        yield client
+    get_engine.cache_clear()
+
+
+def register(client: TestClient):
+    response = client.post("/api/v1/auth/register", json=CREDENTIALS)
+    assert response.status_code == 201, response.text
+    return response
+
+
+def auth_headers(client: TestClient) -> dict:
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": CREDENTIALS["email"], "password": CREDENTIALS["password"]},
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_write_marks_client_to_read_from_primary(client):
+    response = register(client)
+
+    until = float(response.headers[READ_PRIMARY_HEADER])
+    assert time.time() < until <= time.time() + settings.REPLICA_STICKY_SECONDS + 1
+    assert READ_PRIMARY_COOKIE in response.cookies
+
+
+def test_read_after_own_write_uses_primary(client):
+    register(client)
+
+    # The cookie from /register keeps this read off the lagging replica
+    response = client.get("/api/v1/users/me", headers=auth_headers(client))
+
+    assert response.status_code == 200
+    assert response.json()["email"] == CREDENTIALS["email"]
+
+
+def test_marker_header_works_without_cookies(client):
+    until = register(client).headers[READ_PRIMARY_HEADER]
+    client.cookies.clear()
+
+    response = client.get(
+        "/api/v1/users/me", headers={**auth_headers(client), READ_PRIMARY_HEADER: until}
+    )
+
+    assert response.status_code == 200
+
+
+def test_reads_without_recent_write_use_replica(client):
+    register(client)
+    client.cookies.clear()
+
+    # The replica has not seen the new user
+    response = client.get("/api/v1/users/me", headers=auth_headers(client))
+
+    assert response.status_code == 404
+
+
+def test_expired_marker_uses_replica(client):
+    register(client)
+    client.cookies.clear()
+
+    response = client.get(
+        "/api/v1/users/me",
+        headers={**auth_headers(client), READ_PRIMARY_HEADER: f"{time.time() - 1:.3f}"},
+    )
+
+    assert response.status_code == 404
+
+
+def test_unreachable_replica_fails_over_to_primary(client, tmp_path, monkeypatch):
+    register(client)
+    client.cookies.clear()
+    unreachable = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    monkeypatch.setattr(replica_router, "_engines", [unreachable])
+
+    response = client.get("/api/v1/users/me", headers=auth_headers(client))
+
+    assert response.status_code == 200
+    assert replica_router._down_until[unreachable] > time.monotonic()
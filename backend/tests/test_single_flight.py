@@ -0,0 +1,20 @@
+from app.core.single_flight import flight_key
+
+
+def context(*contents: str) -> list:
+    roles = ["user", "assistant"]
+    return [{"role": roles[i % 2], "content": c} for i, c in enumerate(contents)]
+
+
+def test_key_ignores_case_and_whitespace_in_query_and_context():
+    assert flight_key(
+        "Explain Black Holes", context("Hi", "Hello!", "Explain Black Holes"), None
+    ) == flight_key("explain  black holes", context("hi ", "hello!", "explain  black holes"), None)
+
+
+def test_key_depends_on_context_and_levels():
+    base = flight_key("Why?", context("Explain tides", "...", "Why?"), ["eli5"])
+
+    assert base != flight_key("Why?", context("Explain stars", "...", "Why?"), ["eli5"])
+    assert base != flight_key("Why?", context("Explain tides", "...", "Why?"), ["expert"])
+    assert base == flight_key("Why?", context("Explain tides", "...", "Why?"), ["eli5"])
@@ -1,5 +1,9 @@
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8000";
 
+// Cookies carry the backend's read-your-writes marker, so reads right after a
+// write see it even when they are served by another instance
+const CREDENTIALS: RequestCredentials = "include";
+
 export async function login(email: string, password: string) {
   // Use URLSearchParams for form data as expected by OAuth2PasswordRequestForm
   const formData = new URLSearchParams();
@@ -7,6 +11,7 @@ export async function login(email: string, password: string) {
   formData.append('password', password);
   
   const res = await fetch(`${API_BASE_URL}/api/v1/auth/login`, {
+    credentials: CREDENTIALS,
     method: "POST",
     headers: { "Content-Type": "application/x-www-form-urlencoded" },
     body: formData,
@@ -17,6 +22,7 @@ export async function login(email: string, password: string) {
 
 export async function signup(email: string, password: string) {
   const res = await fetch(`${API_BASE_URL}/api/v1/auth/register`, {
+    credentials: CREDENTIALS,
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ email, password }),
@@ -27,6 +33,7 @@ export async function signup(email: string, password: string) {
 
 export async function getChats(token: string) {
   const res = await fetch(`${API_BASE_URL}/api/v1/chats/`, {
+    credentials: CREDENTIALS,
     headers: { Authorization: `Bearer ${token}` },
   });
   if (!res.ok) throw new Error("Failed to fetch chats");
@@ -35,6 +42,7 @@ export async function getChats(token: string) {
 
 export async function getChat(chatId: string, token: string) {
   const res = await fetch(`${API_BASE_URL}/api/v1/chats/${chatId}`, {
+    credentials: CREDENTIALS,
     headers: { Authorization: `Bearer ${token}` },
   });
   if (!res.ok) throw new Error("Failed to fetch chat");
@@ -43,6 +51,7 @@ export async function getChat(chatId: string, token: string) {
 
 export async function createChat(initialQuery: string, token: string) {
   const res = await fetch(`${API_BASE_URL}/api/v1/chats/`, {
+    credentials: CREDENTIALS,
     method: "POST",
     headers: {
       "Content-Type": "application/json",
@@ -60,6 +69,7 @@ export async function sendMessage(
   token: string
 ) {
   const res = await fetch(`${API_BASE_URL}/api/v1/chats/${chatId}/messages`, {
+    credentials: CREDENTIALS,
     method: "POST",
     headers: {
       "Content-Type": "application/json",
@@ -82,6 +92,7 @@ export async function sendMessageStream(
   onChunk: (chunk: any) => void
 ) {
   const response = await fetch(`${API_BASE_URL}/api/v1/chats/${chatId}/messages`, {
+    credentials: CREDENTIALS,
     method: "POST",
     headers: {
       "Content-Type": "application/json",
@@ -154,8 +165,8 @@ export async function sendMessageStream(
 
 export async function deleteChat(chatId: string, token: string): Promise<void> {
   const response = await fetch(`${API_BASE_URL}/api/v1/chats/${chatId}`, {
+    credentials: CREDENTIALS,
     method: 'DELETE',
-    credentials: 'include',
     headers: {
       'Content-Type': 'application/json',
       'Authorization': `Bearer ${token}`